@@ -0,0 +1,327 @@
+# Offline benchmark for the command handlers: drives the Venture/Extras cogs with stand-in Discord objects against a
+# throwaway database seeded with synthetic players, and reports throughput, latency and SQL work per command.
+# No token or network needed. Run it before and after a storage change and compare (--json keeps a copy to diff).
+#   python bench.py --users 5000 --iterations 500 --commands work,crime,invest,rob,nanopulse
+# --backend memory runs the same commands on storage.MemoryStorage, for the cost of the game logic without SQLite.
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+from cache import ENTERPRISE_COLUMNS, USER_COLUMNS
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+# command -> (cog, args after the interaction given the other player)
+COMMANDS = {
+    "work": ("venture", lambda other: ()),
+    "crime": ("venture", lambda other: ()),
+    "invest": ("venture", lambda other: ()),
+    "rob": ("venture", lambda other: (other,)),
+    "nanopulse": ("extras", lambda other: (other,)),
+    "transfer": ("venture", lambda other: (other, 10)),
+    "funds": ("venture", lambda other: ()),
+    "enterprise": ("venture", lambda other: ()),
+    "daily": ("extras", lambda other: ()),
+    "top": ("extras", lambda other: (1, "global")),
+}
+DEFAULT_COMMANDS = "work,crime,invest,rob,nanopulse"
+# Put back before each run so every command takes its full path instead of bouncing off a cooldown
+COOLDOWN_RESET = {"last_work": 0, "last_crime": 0, "last_rob": 0, "nanopulse_count": 0, "last_daily": None}
+
+
+class FakeResponse:
+    def __init__(self):
+        self.done = False
+        self.sent = 0
+
+    def is_done(self) -> bool:
+        return self.done
+
+    async def defer(self, thinking=False, ephemeral=False):
+        self.done = True
+
+    async def send_message(self, content=None, embed=None, ephemeral=False):
+        self.done = True
+        self.sent += 1
+
+
+class FakeFollowup:
+    def __init__(self, response: FakeResponse):
+        self.response = response
+
+    async def send(self, content=None, embed=None, ephemeral=False):
+        self.response.sent += 1
+
+
+class FakeMember:
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.name = self.display_name = f"player{user_id}"
+        self.mention = f"<@{user_id}>"
+        self.avatar = None
+        self.bot = False
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int, members: dict):
+        self.id = guild_id
+        self.name = "bench"
+        self.members = members  # id -> FakeMember
+        self.text_channels = []
+
+    def get_member(self, user_id: int):
+        return self.members.get(user_id)
+
+    def get_channel(self, channel_id: int):
+        return None
+
+    async def query_members(self, user_ids=None, limit=5, cache=True):
+        return [self.members[user_id] for user_id in user_ids or () if user_id in self.members]
+
+
+class FakeInteraction:
+    ids = itertools.count(1)
+
+    def __init__(self, user: FakeMember, guild: FakeGuild):
+        self.id = next(self.ids)
+        self.application_id = 1
+        self.token = f"bench-{self.id}"
+        self.user = user
+        self.guild = guild
+        self.guild_id = guild.id
+        self.created_at = datetime.now(timezone.utc)
+        self.response = FakeResponse()
+        self.followup = FakeFollowup(self.response)
+
+
+class StatementCounter:
+    # sqlite3 trace callback on the writer and every reader connection. The implicit BEGIN and the COMMIT show up in
+    # the trace too; COMMITs are counted on their own, BEGIN/ROLLBACK not at all. executemany traces once per row.
+    def __init__(self, db):
+        self.db = db
+        self.lock = threading.Lock()
+        self.traced = set()
+        self.statements = 0
+        self.commits = 0
+
+    def trace(self, sql: str):
+        with self.lock:
+            if sql == "COMMIT":
+                self.commits += 1
+            elif not sql.startswith(("BEGIN", "ROLLBACK")):
+                self.statements += 1
+
+    def attach(self):
+        if self.db.conn is None:
+            return  # Memory backend: no SQL to count
+        if id(self.db.conn) not in self.traced:
+            self.db.call(self.db.conn.set_trace_callback, self.trace)
+            self.traced.add(id(self.db.conn))
+        # Reader threads start on demand; get them all up first so none of them opens an untraced connection mid-run
+        readers = self.db.readers._max_workers
+        barrier = threading.Barrier(readers)
+        for future in [self.db.readers.submit(barrier.wait, 5) for _ in range(readers)]:
+            future.result()
+        for conn in self.db.read_conns:
+            if id(conn) not in self.traced:
+                conn.set_trace_callback(self.trace)
+                self.traced.add(id(conn))
+
+    def snapshot(self) -> tuple:
+        with self.lock:
+            return self.statements, self.commits
+
+
+def seed(main, users: int, rng: random.Random):
+    # Every player gets money to spend and an enterprise below Empire, with enough profit_earned to invest.
+    # (Empire can't invest: handle_invest reads Dynasty's invest_cost, which is None)
+    now = datetime.utcnow()
+    user_rows = []
+    enterprise_rows = []
+    for user_id in range(1, users + 1):
+        values = dict(main.USER_DEFAULTS, balance=rng.randint(10_000, 1_000_000), bank=rng.randint(0, 100_000))
+        user_rows.append((str(user_id), *(values[column] for column in USER_COLUMNS)))
+        industry = rng.choice(list(main.INDUSTRIES))
+        tier = rng.randint(0, len(main.TIERS) - 3)
+        enterprise = {
+            "name": f"Corp {user_id}", "industry": industry, "tier": tier,
+            "profit": int(main.TIERS[tier]["profit"] * main.INDUSTRIES[industry]["profit_mult"]),
+            "work_bonus": int(main.TIERS[tier]["work_bonus"] * main.INDUSTRIES[industry]["work_mult"]),
+            "crime_bonus": int(main.TIERS[tier]["crime_bonus"] * main.INDUSTRIES[industry]["crime_mult"]),
+            "profit_earned": rng.randint(0, 100_000), "overclock_active": 0, "overclock_end": 0, "crash_end": 0,
+            "created": now.isoformat(), "settled_at": int(now.timestamp()),
+        }
+        enterprise_rows.append((str(user_id), *(enterprise[column] for column in ENTERPRISE_COLUMNS)))
+    main.storage.save_users(USER_COLUMNS, user_rows)
+    main.storage.save_enterprises(enterprise_rows)
+    main.storage.commit()
+    main.leaderboard.stale = True
+
+
+def reset_cooldowns(main, user_ids: list):
+    # Cached players are reset in memory and the rest in storage, so the cache hit rate the command sees stays its own
+    uncached = []
+    with main.user_cache.lock:
+        for user_id in user_ids:
+            state = main.user_cache.peek(user_id)
+            if state is None:
+                row = dict(zip(USER_COLUMNS, main.storage.load_user(user_id)[0]), **COOLDOWN_RESET)
+                uncached.append((user_id, *(row[column] for column in USER_COLUMNS)))
+                continue
+            for column, value in COOLDOWN_RESET.items():
+                state.set(column, value)
+    main.storage.save_users(tuple(COOLDOWN_RESET), uncached)
+    main.storage.commit()
+
+
+def percentile(ordered: list, fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+async def run_command(main, cogs: dict, name: str, players: list, guild: FakeGuild, args, counter: StatementCounter, rng: random.Random) -> dict:
+    cog_name, make_args = COMMANDS[name]
+    cog = cogs[cog_name]
+    command = getattr(cog, name)
+    # Each player acts once per command, so nobody hits their own cooldown; the other player is anyone else
+    actors = rng.sample(players, args.iterations)
+    await main.db.run(reset_cooldowns, main, [str(actor.id) for actor in actors])
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(actor: FakeMember):
+        nonlocal errors
+        other = rng.choice(players)
+        while other is actor:
+            other = rng.choice(players)
+        interaction = FakeInteraction(actor, guild)
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await command.callback(cog, interaction, *make_args(other))
+            except Exception:
+                errors += 1
+                logging.getLogger('bench').exception(f"/{name} failed")
+            latencies.append(time.perf_counter() - start)
+
+    counter.attach()
+    hits, misses = main.user_cache.hits, main.user_cache.misses
+    statements, commits = counter.snapshot()
+    started = time.perf_counter()
+    await asyncio.gather(*(one(actor) for actor in actors))
+    elapsed = time.perf_counter() - started
+    statements, commits = (after - before for after, before in zip(counter.snapshot(), (statements, commits)))
+    hits, misses = main.user_cache.hits - hits, main.user_cache.misses - misses
+    latencies.sort()
+    return {
+        "command": name,
+        "runs": len(latencies),
+        "errors": errors,
+        "per_second": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "statements": round(statements / len(latencies), 2),
+        "commits": round(commits / len(latencies), 2),
+        "cache_hit_rate": round(hits / (hits + misses), 3) if hits + misses else None,
+    }
+
+
+def print_report(results: list, config: dict):
+    print(f"{config['users']} users, {config['iterations']} runs/command, concurrency {config['concurrency']}, "
+          f"cache {config['cache_size']}, {config['backend']} backend, SQLite {config['sqlite']}, Python {config['python']}")
+    header = f"{'command':<12}{'runs':>6}{'errors':>8}{'cmd/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'stmts':>8}{'commits':>9}{'hit rate':>10}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        hit_rate = "-" if result["cache_hit_rate"] is None else f"{result['cache_hit_rate']:.0%}"
+        print(f"{result['command']:<12}{result['runs']:>6}{result['errors']:>8}{result['per_second']:>10}{result['p50_ms']:>10}"
+              f"{result['p99_ms']:>10}{result['statements']:>8}{result['commits']:>9}{hit_rate:>10}")
+
+
+async def bench(main, args) -> list:
+    import venture
+    import extras
+    rng = random.Random(args.seed)
+    random.seed(args.seed)  # The handlers roll their own dice
+    await main.db.run(seed, main, args.users, rng)
+    players = [FakeMember(user_id) for user_id in range(1, args.users + 1)]
+    guild = FakeGuild(1, {player.id: player for player in players})
+    cogs = {"venture": venture.Venture(main.bot), "extras": extras.Extras(main.bot)}
+    counter = StatementCounter(main.db)
+    results = []
+    for name in args.commands:
+        results.append(await run_command(main, cogs, name, players, guild, args, counter, rng))
+    # Whatever write-behind left dirty, so a storage change can't hide work in the next flush
+    counter.attach()
+    before = counter.snapshot()
+    started = time.perf_counter()
+    flushed = await main.db.run(main.user_cache.flush)
+    statements, commits = (after - start for after, start in zip(counter.snapshot(), before))
+    results.append({"command": "(flush)", "runs": flushed, "errors": 0, "per_second": 0.0, "p50_ms": round((time.perf_counter() - started) * 1000, 3),
+                    "p99_ms": 0.0, "statements": statements, "commits": commits, "cache_hit_rate": None})
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark Zentrix commands offline against a synthetic database")
+    parser.add_argument("--users", type=int, default=1000, help="synthetic players (each with an enterprise)")
+    parser.add_argument("--iterations", type=int, default=200, help="runs per command, one per player")
+    parser.add_argument("--commands", default=DEFAULT_COMMANDS, help=f"comma separated, from: {', '.join(COMMANDS)}")
+    parser.add_argument("--concurrency", type=int, default=1, help="commands in flight at once")
+    parser.add_argument("--cache-size", type=int, default=None, help="override USER_CACHE_SIZE, e.g. small to force misses")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--backend", choices=("sqlite", "memory"), default="sqlite", help="storage backend, see storage.py")
+    parser.add_argument("--json", metavar="PATH", help="also write the results here")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary database directory")
+    args = parser.parse_args()
+    args.commands = [name.strip() for name in args.commands.split(",") if name.strip()]
+    unknown = [name for name in args.commands if name not in COMMANDS]
+    if unknown:
+        parser.error(f"unknown commands: {', '.join(unknown)}")
+    if args.json:
+        args.json = os.path.abspath(args.json)  # Before we chdir into the scratch directory
+    if args.iterations > args.users:
+        parser.error("--iterations can't exceed --users: each player acts once per command so cooldowns never kick in")
+    return args
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.WARNING)  # Before main.py's own basicConfig, which then leaves it alone
+    workdir = tempfile.mkdtemp(prefix="zentrix-bench-")
+    os.chdir(workdir)  # main.py opens zentrix.db relative to the working directory
+    sys.path.insert(0, REPO)
+    os.environ["ZENTRIX_BACKEND"] = args.backend  # Read when main.py is imported
+    import main as zentrix
+    try:
+        if args.cache_size is not None:
+            zentrix.user_cache.size = args.cache_size
+        results = asyncio.run(bench(zentrix, args))
+    finally:
+        zentrix.db.close()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+    config = {"users": args.users, "iterations": args.iterations, "concurrency": args.concurrency,
+              "cache_size": zentrix.user_cache.size, "seed": args.seed, "backend": args.backend, "sqlite": sqlite3.sqlite_version,
+              "python": platform.python_version()}
+    print_report(results, config)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": config, "results": results}, f, indent=2)
+    if args.keep:
+        print(f"Database kept in {workdir}")
+
+
+if __name__ == "__main__":
+    main()
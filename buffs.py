@@ -0,0 +1,81 @@
+import heapq
+
+INCOME_TYPES = ("work", "crime", "profit")
+
+
+class BuffBoard:
+    # Active buffs for every user who has any, with their multipliers worked out ahead of time, so a buff check is a
+    # dict lookup and never rewrites the user's row. Expiry is a timer heap: due() hands back what lapsed so the caller
+    # can strip it from storage once, instead of every command re-walking the buffs JSON.
+    def __init__(self, catalog: dict):
+        self.catalog = catalog
+        self.active = {}  # user_id -> {item: end_time}
+        self.table = {}  # user_id -> (valid_until, {"work": x, "crime": x, "profit": x, "anti_rob": bool})
+        self.heap = []  # (end_time, user_id, item); entries for buffs since replaced are skipped when popped
+
+    def __len__(self):
+        return len(self.active)
+
+    def load(self, user_id: str, buffs: dict):
+        # (Re)sync one user from their buffs column
+        buffs = {item: end for item, end in (buffs or {}).items() if item in self.catalog}
+        self.table.pop(user_id, None)
+        if not buffs:
+            self.active.pop(user_id, None)
+            return
+        previous = self.active.get(user_id, {})
+        self.active[user_id] = buffs
+        for item, end in buffs.items():
+            if previous.get(item) != end:
+                heapq.heappush(self.heap, (end, user_id, item))
+
+    def compute(self, user_id: str, now: int) -> dict:
+        multipliers = {buff_type: 1.0 for buff_type in INCOME_TYPES}
+        multipliers["anti_rob"] = False
+        ends = []
+        for item, end in self.active.get(user_id, {}).items():
+            if now > end:
+                continue
+            buff = self.catalog[item]
+            for buff_type in INCOME_TYPES:
+                if buff["type"] in (buff_type, "all"):
+                    multipliers[buff_type] *= buff["multiplier"]
+            multipliers["anti_rob"] = multipliers["anti_rob"] or buff["anti_rob"]
+            ends.append(end)
+        # Good until the first of these lapses, even if the expiry tick hasn't run yet
+        self.table[user_id] = (min(ends, default=float("inf")), multipliers)
+        return multipliers
+
+    def lookup(self, user_id: str, now: int) -> dict:
+        if user_id not in self.active:
+            return None
+        entry = self.table.get(user_id)
+        if entry is None or now > entry[0]:
+            return self.compute(user_id, now)
+        return entry[1]
+
+    def multiplier(self, user_id: str, buff_type: str, now: int) -> float:
+        multipliers = self.lookup(user_id, now)
+        return multipliers[buff_type] if multipliers else 1.0
+
+    def anti_rob(self, user_id: str, now: int) -> bool:
+        multipliers = self.lookup(user_id, now)
+        return bool(multipliers and multipliers["anti_rob"])
+
+    def next_expiry(self) -> float:
+        return self.heap[0][0] if self.heap else None
+
+    def due(self, now: int) -> list:
+        # Pop everything that has lapsed: [(user_id, item, end_time)]
+        expired = []
+        while self.heap and self.heap[0][0] < now:
+            end, user_id, item = heapq.heappop(self.heap)
+            buffs = self.active.get(user_id)
+            if not buffs or buffs.get(item) != end:
+                continue  # Replaced or already gone
+            del buffs[item]
+            if not buffs:
+                del self.active[user_id]
+            self.table.pop(user_id, None)
+            expired.append((user_id, item, end))
+        return expired
@@ -0,0 +1,200 @@
+import copy
+import json
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger('Zentrix')
+
+# users table columns, in schema order (user_id excluded)
+USER_COLUMNS = ("balance", "bank", "last_work", "last_crime", "last_daily", "daily_streak", "inventory", "buffs",
+                "last_buff", "challenges", "nanopulse_count", "last_nanopulse_reset", "contracts", "last_rob")
+JSON_COLUMNS = frozenset(("inventory", "buffs", "challenges", "contracts"))
+# enterprises table columns (user_id excluded); the cache exposes a row as the same dict get_enterprise() always returned
+ENTERPRISE_COLUMNS = ("name", "industry", "tier", "profit", "work_bonus", "crime_bonus", "profit_earned",
+                      "overclock_active", "overclock_end", "crash_end", "created", "settled_at")
+
+
+class UserState:
+    # One users row (JSON columns already decoded) plus the enterprise as a dict
+    __slots__ = ("user_id", "exists", "dirty", "enterprise", "enterprise_dirty") + USER_COLUMNS
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.exists = False
+        self.dirty = set()
+        self.enterprise = None
+        self.enterprise_dirty = False
+
+    def set(self, column: str, value):
+        setattr(self, column, value)
+        self.dirty.add(column)
+
+    def set_enterprise(self, enterprise: dict):
+        self.enterprise = enterprise
+        self.enterprise_dirty = True
+
+    @property
+    def is_dirty(self) -> bool:
+        return bool(self.dirty) or self.enterprise_dirty
+
+    def checkpoint(self) -> tuple:
+        # Deep copy: handlers edit inventory/buffs/etc. in place before calling the setter
+        return (self.exists, set(self.dirty), copy.deepcopy(self.enterprise), self.enterprise_dirty,
+                [copy.deepcopy(getattr(self, column)) if column in JSON_COLUMNS else getattr(self, column) for column in USER_COLUMNS])
+
+    def restore(self, checkpoint: tuple):
+        self.exists, self.dirty, self.enterprise, self.enterprise_dirty, values = checkpoint
+        for column, value in zip(USER_COLUMNS, values):
+            setattr(self, column, value)
+
+
+class UserCache:
+    # LRU of UserState with write-behind: setters only mark columns dirty, flush() writes them in one transaction.
+    # Owned by the database thread; reader threads only use read(), and `lock` keeps them out of units still running
+    # (not out of the flush that follows one).
+    def __init__(self, storage, defaults: dict, size: int = 10000, journal=None, settle=None):
+        self.storage = storage  # See storage.py
+        self.journal = journal  # Optional Ledger: its buffered entries are written in the same commit as the rows
+        self.settle = settle  # Optional settle(state, live): bring lazily accrued values up to date when a user is touched
+        self.defaults = defaults
+        self.size = size
+        self.states = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.undo = None  # user_id -> checkpoint while a unit of work is open
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.states)
+
+    def peek(self, user_id: str):
+        return self.states.get(user_id)
+
+    def get(self, user_id: str) -> UserState:
+        state = self.states.get(user_id)
+        if state is not None:
+            self.hits += 1
+            with self.lock:
+                self.states.move_to_end(user_id)
+        else:
+            self.misses += 1
+            state = self.load(user_id)
+            with self.lock:
+                self.states[user_id] = state
+            # Evicting flushes, and a flush mid-unit would write half a command; wait for the unit to end
+            if len(self.states) > self.size and self.undo is None:
+                self.evict()
+        # Settle once per unit, after the checkpoint so a rollback undoes it too
+        if self.undo is None or user_id not in self.undo:
+            if self.undo is not None:
+                self.undo[user_id] = state.checkpoint()
+            if self.settle:
+                self.settle(state, True)
+        return state
+
+    def read(self, user_id: str, storage) -> UserState:
+        # Reader threads: a private copy of the cached state (it may hold unflushed writes), else the committed row via `storage`
+        with self.lock:
+            state = self.states.get(user_id)
+            if state is not None:
+                copy = UserState(user_id)
+                copy.restore(state.checkpoint())
+            else:
+                copy = None
+        if copy is None:
+            copy = self.load(user_id, storage)
+        if self.settle:
+            self.settle(copy, False)  # Show what's owed without writing it
+        return copy
+
+    def begin(self):
+        self.lock.acquire()
+        self.undo = {}
+
+    def end(self) -> dict:
+        # Readers see the unit's edits from here on; its checkpoints come back in case writing them out fails
+        undo, self.undo = self.undo, None
+        self.lock.release()
+        return undo
+
+    def restore(self, checkpoints: dict):
+        # Put these users back the way they were at their checkpoints
+        with self.lock:
+            for user_id, checkpoint in checkpoints.items():
+                state = self.states.get(user_id)
+                if state is not None:
+                    state.restore(checkpoint)
+
+    def load(self, user_id: str, storage=None) -> UserState:
+        # users row and enterprise together; NULL columns come back as their defaults
+        state = UserState(user_id)
+        user_row, enterprise_row = (storage or self.storage).load_user(user_id)
+        state.exists = user_row is not None
+        for column, value in zip(USER_COLUMNS, user_row or (None,) * len(USER_COLUMNS)):
+            if value is None:
+                value = self.defaults[column]
+            if column in JSON_COLUMNS and value is not None:
+                value = json.loads(value)
+            setattr(state, column, value)
+        if enterprise_row is not None:
+            state.enterprise = self.decode_enterprise(enterprise_row)
+        return state
+
+    def evict(self):
+        while len(self.states) > self.size:
+            user_id, state = next(iter(self.states.items()))
+            if state.is_dirty:
+                # Write everything pending in one go rather than one row per eviction
+                self.flush()
+            with self.lock:
+                del self.states[user_id]
+
+    def flush(self) -> int:
+        dirty = [state for state in self.states.values() if state.is_dirty]
+        if not dirty and not (self.journal and self.journal.pending):
+            return 0
+        # Rows with the same set of dirty columns share one statement, so each group is one save_users()
+        batches = {}
+        enterprises = []
+        for state in dirty:
+            if state.dirty:
+                columns = tuple(sorted(state.dirty)) if state.exists else USER_COLUMNS
+                batches.setdefault(columns, []).append(state)
+            if state.enterprise_dirty:
+                enterprises.append((state.user_id, *self.encode_enterprise(state.enterprise)))
+        try:
+            for columns, states in batches.items():
+                self.storage.save_users(columns, [(state.user_id, *(self.encode(state, column) for column in USER_COLUMNS)) for state in states])
+            if enterprises:
+                self.storage.save_enterprises(enterprises)
+            journaled = self.journal.write(self.storage) if self.journal else 0
+            self.storage.commit()
+        except Exception:
+            self.storage.rollback()
+            logger.exception(f"User cache flush failed, {len(dirty)} entries stay dirty")
+            raise
+        if journaled:
+            self.journal.written(journaled)
+        for state in dirty:
+            if state.dirty:
+                state.exists = True
+            state.dirty.clear()
+            state.enterprise_dirty = False
+        return len(dirty)
+
+    @staticmethod
+    def encode(state: UserState, column: str):
+        value = getattr(state, column)
+        return json.dumps(value) if column in JSON_COLUMNS and value is not None else value
+
+    @staticmethod
+    def decode_enterprise(row) -> dict:
+        enterprise = dict(zip(ENTERPRISE_COLUMNS, row))
+        enterprise["overclock_active"] = bool(enterprise["overclock_active"])
+        enterprise["profit_earned"] = enterprise["profit_earned"] or 0
+        return enterprise
+
+    @staticmethod
+    def encode_enterprise(enterprise: dict) -> tuple:
+        return tuple(int(enterprise.get(column) or 0) if column == "overclock_active" else enterprise.get(column) for column in ENTERPRISE_COLUMNS)
@@ -0,0 +1,218 @@
+import argparse
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Client, Listener
+
+from tracing import task_label
+
+logger = logging.getLogger('Zentrix')
+
+# Cluster mode: `python cluster.py --workers 4` runs the shards across several processes instead of one.
+# One storage process owns zentrix.db, the user cache and the ledger, and runs the database upkeep loops; it has no
+# gateway. Each worker runs an AutoShardedBot for its share of the shards and sends every db.run()/db.read() to the
+# storage process over a Unix socket, so SQLite still has a single writer and a user's balance is the same from every
+# shard. Commands and Discord I/O scale with the workers; the writes themselves are still one at a time.
+# `python main.py` is still the whole bot in one process.
+
+
+class RemoteExecutor:
+    # Stands in for DatabaseExecutor in a worker. run()/read()/call() send the function and its arguments to the storage
+    # process and wait for the result. Functions go by name (pickle), so they have to be module-level functions that the
+    # storage process can import too; arguments and results have to pickle.
+    def __init__(self, address: str, authkey: bytes, connections: int = 8):
+        self.address = address
+        self.authkey = authkey
+        self.conn = None  # The database lives in the storage process
+        self.pool = ThreadPoolExecutor(max_workers=connections, thread_name_prefix='zentrix-rpc')
+        self.local = threading.local()  # One socket per pool thread, so requests don't interleave
+        self.conns = []
+        self.lock = threading.Lock()
+
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = Client(self.address, family='AF_UNIX', authkey=self.authkey)
+            with self.lock:
+                self.conns.append(conn)
+        return conn
+
+    def request(self, mode: str, fn, args: tuple, kwargs: dict):
+        conn = self.connection()
+        try:
+            conn.send((mode, fn, args, kwargs, task_label.get()))
+            status, value = conn.recv()
+        except (EOFError, OSError) as e:
+            # Not retried: the storage process may have applied it before going away
+            self.local.conn = None
+            conn.close()
+            raise ConnectionError("Lost the connection to the storage process") from e
+        if status == "error":
+            raise value
+        return value
+
+    async def run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool, functools.partial(contextvars.copy_context().run, self.request, "run", fn, args, kwargs))
+
+    async def read(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool, functools.partial(contextvars.copy_context().run, self.request, "read", fn, args, kwargs))
+
+    def call(self, fn, *args, **kwargs):
+        return self.request("run", fn, args, kwargs)
+
+    def on_db_thread(self) -> bool:
+        return False
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+        with self.lock:
+            for conn in self.conns:
+                conn.close()
+            self.conns.clear()
+
+
+class StorageServer:
+    # The storage process's end. Each worker connection gets a thread that waits for requests and hands them to the
+    # DatabaseExecutor: writes queue for its one writer thread as they always have, reads go to the reader pool.
+    def __init__(self, db, address: str, authkey: bytes):
+        self.db = db
+        self.listener = Listener(address, family='AF_UNIX', authkey=authkey)
+
+    def start(self):
+        threading.Thread(target=self.accept_loop, name='zentrix-storage', daemon=True).start()
+
+    def accept_loop(self):
+        while True:
+            try:
+                conn = self.listener.accept()
+            except OSError:
+                return  # Listener closed
+            except Exception as e:
+                logger.warning(f"Rejected a storage connection: {e!r}")
+                continue
+            threading.Thread(target=self.serve, args=(conn,), name='zentrix-storage-conn', daemon=True).start()
+
+    def execute(self, mode: str, fn, args: tuple, kwargs: dict):
+        if mode == "read":
+            return self.db.readers.submit(contextvars.copy_context().run, fn, *args, **kwargs).result()
+        return self.db.call(fn, *args, **kwargs)
+
+    def serve(self, conn):
+        with conn:
+            while True:
+                try:
+                    mode, fn, args, kwargs, label = conn.recv()
+                except (EOFError, OSError):
+                    return
+                except Exception as e:
+                    conn.send(("error", e))  # Couldn't unpickle it, e.g. a function this process doesn't have
+                    continue
+                context = contextvars.Context()
+                context.run(task_label.set, label)  # SQL stats count it under the worker's command or task
+                try:
+                    reply = ("ok", context.run(self.execute, mode, fn, args, kwargs))
+                except Exception as e:
+                    reply = ("error", e)
+                try:
+                    conn.send(reply)
+                except Exception as e:
+                    conn.send(("error", RuntimeError(f"{getattr(fn, '__name__', fn)} returned something that can't be sent back: {e!r}")))
+
+    def close(self):
+        self.listener.close()
+
+
+def wait_for_storage(address: str, authkey: bytes, process: subprocess.Popen, timeout: float = 300):
+    # The storage process loads the caches before it listens; a connection that authenticates means it's ready
+    deadline = time.monotonic() + timeout
+    while True:
+        if process.poll() is not None:
+            raise RuntimeError(f"Storage process exited with {process.returncode} during startup")
+        try:
+            Client(address, family='AF_UNIX', authkey=authkey).close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise RuntimeError("Storage process didn't start listening in time")
+            time.sleep(0.2)
+
+
+def stop(processes: list, timeout: float = 60):
+    # SIGINT, not SIGTERM: asyncio.run() turns it into a cancellation, so main()'s finally flushes the cache
+    for process in processes:
+        if process.poll() is None:
+            process.send_signal(signal.SIGINT)
+    for process in processes:
+        try:
+            process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            logger.warning(f"Process {process.pid} didn't stop in {timeout}s, killing it")
+            process.kill()
+
+
+def launch(workers: int, shards: int) -> int:
+    # Storage first, then the workers once it's listening. Shards are dealt out round-robin. If any process dies the
+    # whole cluster stops, so the platform restarts it in one piece.
+    signal.signal(signal.SIGTERM, signal.default_int_handler)  # Platform stop: shut down like a Ctrl-C
+    address = os.path.join(tempfile.mkdtemp(prefix='zentrix-'), 'storage.sock')
+    authkey = os.urandom(16)
+    env = {**os.environ, "ZENTRIX_STORAGE": address, "ZENTRIX_STORAGE_KEY": authkey.hex()}
+    # Own sessions: a Ctrl-C reaches only the launcher, which then stops the workers before storage
+    spawn = functools.partial(subprocess.Popen, [sys.executable, os.path.abspath(__file__)], start_new_session=True)
+    storage = spawn(env={**env, "ZENTRIX_ROLE": "storage"})
+    workers_running = []
+    try:
+        wait_for_storage(address, authkey, storage)
+        logger.info(f"Storage process {storage.pid} listening on {address}")
+        for index in range(workers):
+            worker_env = {**env, "ZENTRIX_ROLE": "worker", "ZENTRIX_WORKER": str(index), "ZENTRIX_SHARD_COUNT": str(shards),
+                          "ZENTRIX_SHARDS": ",".join(str(shard) for shard in range(index, shards, workers))}
+            if index:
+                worker_env.pop("PORT", None)  # Only the first worker binds $PORT for the health check
+            workers_running.append(spawn(env=worker_env))
+            logger.info(f"Worker {index} ({workers_running[-1].pid}): shards {worker_env['ZENTRIX_SHARDS']} of {shards}")
+        while all(process.poll() is None for process in (storage, *workers_running)):
+            time.sleep(1)
+        for process in (storage, *workers_running):
+            if process.returncode is not None:
+                logger.error(f"Process {process.pid} exited with {process.returncode}; stopping the cluster")
+        return 1
+    except KeyboardInterrupt:
+        logger.info("Stopping the cluster")
+        return 0
+    finally:
+        stop(workers_running)
+        stop([storage])
+        shutil.rmtree(os.path.dirname(address), ignore_errors=True)  # The listener usually removed the socket already
+
+
+if __name__ == "__main__":
+    role = os.environ.get("ZENTRIX_ROLE")
+    if role in ("storage", "worker"):
+        import main
+        try:
+            if role == "storage":
+                asyncio.run(main.run_storage(StorageServer(main.db, os.environ["ZENTRIX_STORAGE"], bytes.fromhex(os.environ["ZENTRIX_STORAGE_KEY"]))))
+            else:
+                asyncio.run(main.main())
+        except KeyboardInterrupt:
+            pass  # The launcher's stop(); cleanup already ran
+    else:
+        logging.basicConfig(level=logging.INFO)
+        parser = argparse.ArgumentParser(description="Run Zentrix as a storage process plus several sharded workers")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+        parser.add_argument("--shards", type=int, help="Total shard count (default: one per worker)")
+        args = parser.parse_args()
+        sys.exit(launch(args.workers, args.shards or args.workers))
@@ -0,0 +1,93 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger('Zentrix')
+
+
+class DatabaseExecutor:
+    # Owns the SQLite connection and runs every write on one dedicated thread, so the event loop never waits on disk.
+    # The connection keeps sqlite3's same-thread check, so any stray use from the loop thread fails loudly.
+    # The database runs in WAL mode, so a small pool of read-only connections can serve lookups while the writer is busy.
+    # path=None is the same thread without SQLite (storage.MemoryStorage): no connections, and reads run on the writer too.
+    def __init__(self, path: str, readers: int = 4, factory=sqlite3.Connection):
+        self.path = path
+        self.factory = factory  # Connection class for the writer and readers, e.g. SqlStats.connection_factory()
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='zentrix-db')
+        self.thread_id = self.pool.submit(threading.get_ident).result()
+        self.conn = self.pool.submit(self.connect).result() if path is not None else None
+        self.local = threading.local()
+        self.read_conns = []
+        if path is not None:
+            self.readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix='zentrix-read', initializer=self.open_reader)
+        else:
+            self.readers = self.pool
+        self.checkpointer = None
+        self.checkpoint_lock = threading.Lock()
+
+    def connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, factory=self.factory)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')  # In WAL mode this only risks the last commits on power loss, never corruption
+        conn.execute('PRAGMA busy_timeout=5000')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute('PRAGMA wal_autocheckpoint=0')  # checkpoint() does it in the background instead of on some unlucky commit (see wal_checkpoint_loop)
+        return conn
+
+    def open_reader(self):
+        conn = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True, check_same_thread=False, factory=self.factory)
+        conn.execute('PRAGMA busy_timeout=5000')
+        self.local.conn = conn
+        self.read_conns.append(conn)
+
+    def on_db_thread(self) -> bool:
+        return threading.get_ident() == self.thread_id
+
+    def reader(self) -> sqlite3.Connection:
+        # This reader thread's connection; only valid inside read()
+        return self.local.conn
+
+    async def run(self, fn, *args, **kwargs):
+        # Async facade: await this from cogs and background tasks. run_in_executor doesn't carry context variables
+        # over, so the caller's context goes along explicitly (the SQL stats use it to know who's asking)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool, functools.partial(contextvars.copy_context().run, fn, *args, **kwargs))
+
+    async def read(self, fn, *args, **kwargs):
+        # Like run(), for work that only reads: runs on the reader pool and never queues behind writes
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.readers, functools.partial(contextvars.copy_context().run, fn, *args, **kwargs))
+
+    def call(self, fn, *args, **kwargs):
+        # Blocking variant for startup/shutdown code that isn't running on the event loop
+        if self.on_db_thread():
+            return fn(*args, **kwargs)
+        return self.pool.submit(contextvars.copy_context().run, fn, *args, **kwargs).result()
+
+    def wal_checkpoint(self, mode: str = 'PASSIVE') -> tuple:
+        # Own connection so copying WAL pages back doesn't hold up the writer thread
+        with self.checkpoint_lock:
+            if self.checkpointer is None:
+                self.checkpointer = sqlite3.connect(self.path, check_same_thread=False)
+                self.checkpointer.execute('PRAGMA busy_timeout=5000')
+            return self.checkpointer.execute(f'PRAGMA wal_checkpoint({mode})').fetchone()
+
+    async def checkpoint(self, mode: str = 'PASSIVE') -> tuple:
+        if self.path is None:
+            return 0, 0, 0
+        return await self.read(self.wal_checkpoint, mode)
+
+    def close(self):
+        if self.path is not None:
+            self.readers.shutdown(wait=True)
+            for conn in self.read_conns:
+                conn.close()
+            if self.checkpointer is not None:
+                self.checkpointer.close()
+            self.call(self.conn.execute, 'PRAGMA wal_checkpoint(TRUNCATE)')
+            self.call(self.conn.close)
+        self.pool.shutdown(wait=True)
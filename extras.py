@@ -7,10 +7,168 @@ import asyncio
 import logging
 from datetime import datetime
 import random
-from main import conn, cursor, ZENTRONS_START, DAILY_BASE, NANOPULSE_LIMIT, ZENTRON_EMOJI, CHALLENGES, CONTRACTS, send_with_retry, get_balance, set_balance, get_daily_info, set_daily_info, get_challenges, set_challenges, check_and_refresh_challenges, get_contracts, set_contracts, get_nanopulse_count, set_nanopulse_count, get_last_nanopulse_reset, set_last_nanopulse_reset, get_enterprise, get_inventory, add_to_inventory, get_title
+from main import db, transactional, challenges_need_refresh, user_cache, leaderboard, load_user_snapshot, LEADERBOARD_PAGE_SIZE, get_guild_leaderboard, record_member, with_owed_profit, ZENTRONS_START, DAILY_BASE, NANOPULSE_LIMIT, ZENTRON_EMOJI, CHALLENGE_TEMPLATES, CONTRACT_TEMPLATES, send_with_retry, set_balance, set_daily_info, get_challenges, check_and_refresh_challenges, get_contracts, check_and_refresh_contracts, set_nanopulse_count, set_last_nanopulse_reset, get_inventory, get_title, get_tax_pool, set_tax_pool, set_updates_channel, sql_stats, dispatcher, guild_config
+
+from quests import record_progress
 
 logger = logging.getLogger('Zentrix')
 
+# Command bodies run on the database thread via db.run(), each as one unit of work; they return the kwargs for send_with_retry.
+# The undecorated ones only read and are served from the WAL reader pool via db.read().
+@transactional
+def handle_daily(user_id: str) -> dict:
+    now = datetime.utcnow().date().isoformat()
+    snapshot = load_user_snapshot(user_id)
+    last_daily, streak = snapshot.last_daily, snapshot.daily_streak
+    
+    if last_daily == now:
+        embed = discord.Embed(title="Already Claimed", description="You’ve got today’s loot! Come back tomorrow.", color=0xFF3333)
+        return {"embed": embed, "ephemeral": True}
+    
+    last_date = datetime.fromisoformat(last_daily).date() if last_daily else None
+    if last_date and (datetime.utcnow().date() - last_date).days > 1:
+        streak = 0
+    
+    new_streak = streak + 1
+    reward = min(DAILY_BASE * new_streak, 500)
+    set_balance(user_id, snapshot.balance + reward, "daily")
+    set_daily_info(user_id, now, new_streak)
+    embed = discord.Embed(title="Daily Haul", description=f"Claimed **{reward} {ZENTRON_EMOJI}**!\nStreak: {new_streak} day{'s' if new_streak > 1 else ''}", color=0x00FFAA)
+    return {"embed": embed}
+
+def view_challenges(user_id: str) -> dict:
+    # None when today's set still has to be rolled; the cog then goes through handle_challenges on the writer
+    snapshot = load_user_snapshot(user_id)
+    if challenges_need_refresh(snapshot, datetime.utcnow().date().isoformat()):
+        return None
+    return render_challenges(snapshot.challenges)
+
+@transactional
+def handle_challenges(user_id: str) -> dict:
+    now = datetime.utcnow().date().isoformat()
+    return render_challenges(check_and_refresh_challenges(user_id, now, load_user_snapshot(user_id)))
+
+def render_challenges(challenges: list) -> dict:
+    if not challenges:
+        embed = discord.Embed(title="No Challenges", description="Something’s off—try again later!", color=0xFF3333)
+    else:
+        # Text comes from the templates; the row only has [id, progress]
+        challenge_text = "\n".join(f"**{t['task']}**: {progress}/{t['goal']} (Reward: {t['reward']} {ZENTRON_EMOJI})"
+                                   for t, progress in ((CHALLENGE_TEMPLATES.get(template_id), progress) for template_id, progress in challenges) if t)
+        embed = discord.Embed(title="Daily Challenges", description=challenge_text, color=0x00FFAA)
+        embed.set_footer(text="Complete them before midnight UTC!")
+    return {"embed": embed}
+
+@transactional
+def handle_contracts(user_id: str) -> dict:
+    now = int(datetime.utcnow().timestamp())
+    snapshot = load_user_snapshot(user_id)
+    enterprise = snapshot.enterprise
+    if not enterprise:
+        embed = discord.Embed(title="No Empire", description="Start an enterprise to unlock contracts!", color=0xFF3333)
+        return {"embed": embed}
+    
+    contracts = check_and_refresh_contracts(user_id, datetime.utcnow().date().isoformat(), snapshot)
+    if not contracts:
+        embed = discord.Embed(title="No Contracts", description="Something’s off—try again later!", color=0xFF3333)
+    else:
+        contract_text = "\n".join(f"**{t['task']}**: {progress}/{t['goal']} (Reward: {t['reward']} {ZENTRON_EMOJI} & {t['item']}) - {max(0, (start_time + 21600 - now) // 3600)}h left"
+                                  for t, progress, start_time in ((CONTRACT_TEMPLATES.get(template_id), progress, start_time) for template_id, progress, start_time in contracts) if t)
+        embed = discord.Embed(title=f"{enterprise['industry']} Tech Contracts", description=contract_text, color=0x00FFAA)
+        embed.set_footer(text="Complete within 6 hours from reset!")
+    return {"embed": embed}
+
+@transactional
+def handle_claim_bonus(user_id: str) -> dict:
+    tax_pool = get_tax_pool()
+    snapshot = load_user_snapshot(user_id)
+    enterprise = snapshot.enterprise
+    
+    if not enterprise:
+        embed = discord.Embed(title="No Empire", description="Need an enterprise to claim bonuses!", color=0xFF3333)
+        return {"embed": embed}
+    
+    bonus = min(tax_pool // 10, 50)
+    if bonus <= 0:
+        embed = discord.Embed(title="No Loot", description="Tax pool’s dry. Check later!", color=0xFF3333)
+        return {"embed": embed}
+    
+    set_balance(user_id, snapshot.balance + bonus, "claim_bonus")
+    set_tax_pool(tax_pool - bonus, "claim_bonus", user_id)
+    embed = discord.Embed(title="Bonus Snagged", description=f"Grabbed {bonus} {ZENTRON_EMOJI} from the pool!", color=0x00FFAA)
+    return {"embed": embed}
+
+@transactional
+def handle_nanopulse(sender_id: str, receiver_id: str, target_name: str) -> dict:
+    now = datetime.utcnow().date().isoformat()
+    sender = load_user_snapshot(sender_id)
+    last_reset = sender.last_nanopulse_reset
+    
+    if sender_id == receiver_id:
+        response = "Self-Pulse? You can’t NanoPulse yourself, yaar!"
+        return {"content": response, "ephemeral": True}
+    
+    if last_reset != now:
+        set_nanopulse_count(sender_id, 0)
+        set_last_nanopulse_reset(sender_id, now)
+    
+    count = sender.nanopulse_count
+    if count >= NANOPULSE_LIMIT:
+        response = "Pulse Limit! You’ve sent 3 NanoPulses today! Reset at midnight UTC."
+        return {"content": response, "ephemeral": True}
+    
+    set_nanopulse_count(sender_id, count + 1)
+    set_balance(receiver_id, load_user_snapshot(receiver_id).balance + 10, "nanopulse", sender_id)
+    response = f"NanoPulse Sent! You pulsed {target_name} with a NanoPulse! They got 10 {ZENTRON_EMOJI}. ({NANOPULSE_LIMIT - count - 1} left today)"
+    
+    for title, text in record_progress(sender_id, {"nanopulse_count": 1}, sender):
+        response += f"\n{title}: {text}"
+    
+    return {"content": response}
+
+def fetch_top_players() -> list:
+    return with_owed_profit(leaderboard.top())
+
+async def resolve_member_names(guild, user_ids: list) -> dict:
+    # Member cache first, then one gateway lookup for whoever is left on the page
+    names = {}
+    missing = []
+    for user_id in user_ids:
+        member = guild.get_member(user_id) if guild else None
+        if member:
+            names[user_id] = member.display_name
+        else:
+            missing.append(user_id)
+    if guild and missing:
+        try:
+            for member in await guild.query_members(user_ids=missing[:100], limit=len(missing[:100]), cache=True):
+                names[member.id] = member.display_name
+        except (asyncio.TimeoutError, discord.ClientException) as e:
+            logger.warning(f"Member lookup for /top in guild {guild.id} failed: {e}")
+    return names
+
+def collect_debug_stats() -> tuple:
+    # Through db.read(), so a cluster worker gets the storage process's numbers
+    return sql_stats.summary(limit=8), user_cache.hits, user_cache.misses, len(user_cache), sql_stats.started, sql_stats.slow_ms
+
+def render_debug_stats(stats: tuple) -> discord.Embed:
+    # SQL per command/task since startup, plus how the cache and the response dispatcher are doing
+    summary, hits, misses, cached, started, slow_ms = stats
+    embed = discord.Embed(title="🛠️ Debug Stats", color=0x00FFAA)
+    for label, runs, statements, commits, ms, slow, busiest in summary:
+        per_run = f"{statements / runs:.1f} stmts/run, " if runs else ""
+        value = f"{runs} runs, {statements} stmts ({per_run}{commits} commits), {ms}ms" + (f", {slow} slow" if slow else "")
+        if busiest:
+            value += f"\nTop: `{' '.join(busiest.split())[:80]}`"
+        embed.add_field(name=label, value=value, inline=False)
+    lookups = hits + misses
+    hit_rate = f"{hits / lookups:.0%}" if lookups else "-"
+    embed.add_field(name="User cache", value=f"{cached} users, {hit_rate} hits", inline=True)
+    metrics = dispatcher.metrics()
+    embed.add_field(name="Responses", value=f"{metrics['sent']} sent, {metrics['queue_depth']} queued, {metrics['wait_avg']}s avg wait", inline=True)
+    embed.set_footer(text=f"Since {datetime.utcfromtimestamp(started).strftime('%Y-%m-%d %H:%M')} UTC • slow = over {slow_ms:g}ms")
+    return embed
+
 class Extras(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
@@ -18,144 +176,59 @@ class Extras(commands.Cog):
     @app_commands.command(name="daily", description="Claim your daily Zentrons")
     async def daily(self, interaction: discord.Interaction):
         await interaction.response.defer(thinking=True)
-        user_id = str(interaction.user.id)
-        now = datetime.utcnow().date().isoformat()
-        last_daily, streak = get_daily_info(user_id)
-        
-        if last_daily == now:
-            embed = discord.Embed(title="Already Claimed", description="You’ve got today’s loot! Come back tomorrow.", color=0xFF3333)
-            await send_with_retry(interaction, embed=embed, ephemeral=True)
-            return
-        
-        last_date = datetime.fromisoformat(last_daily).date() if last_daily else None
-        if last_date and (datetime.utcnow().date() - last_date).days > 1:
-            streak = 0
-        
-        new_streak = streak + 1
-        reward = min(DAILY_BASE * new_streak, 500)
-        set_balance(user_id, get_balance(user_id) + reward)
-        set_daily_info(user_id, now, new_streak)
-        embed = discord.Embed(title="Daily Haul", description=f"Claimed **{reward} {ZENTRON_EMOJI}**!\nStreak: {new_streak} day{'s' if new_streak > 1 else ''}", color=0x00FFAA)
-        await send_with_retry(interaction, embed=embed)
+        reply = await db.run(handle_daily, str(interaction.user.id))
+        await send_with_retry(interaction, **reply)
 
     @app_commands.command(name="challenges", description="View your daily challenges")
     async def challenges(self, interaction: discord.Interaction):
         await interaction.response.defer(thinking=True)
-        user_id = str(interaction.user.id)
-        now = datetime.utcnow().date().isoformat()
-        challenges = check_and_refresh_challenges(user_id, now)
-        if not challenges:
-            embed = discord.Embed(title="No Challenges", description="Something’s off—try again later!", color=0xFF3333)
-        else:
-            challenge_text = "\n".join(f"**{c['task']}**: {c['progress']}/{c['goal']} (Reward: {c['reward']} {ZENTRON_EMOJI})" for c in challenges)
-            embed = discord.Embed(title="Daily Challenges", description=challenge_text, color=0x00FFAA)
-            embed.set_footer(text="Complete them before midnight UTC!")
-        await send_with_retry(interaction, embed=embed)
+        reply = await db.read(view_challenges, str(interaction.user.id))
+        if reply is None:
+            reply = await db.run(handle_challenges, str(interaction.user.id))
+        await send_with_retry(interaction, **reply)
 
     @app_commands.command(name="contracts", description="View and claim tech contracts")
     async def contracts(self, interaction: discord.Interaction):
         await interaction.response.defer(thinking=True)
-        user_id = str(interaction.user.id)
-        now = int(datetime.utcnow().timestamp())
-        enterprise = get_enterprise(user_id)
-        if not enterprise:
-            embed = discord.Embed(title="No Empire", description="Start an enterprise to unlock contracts!", color=0xFF3333)
-            await send_with_retry(interaction, embed=embed)
-            return
-        
-        contracts = check_and_refresh_contracts(user_id, datetime.utcnow().date().isoformat())
-        if not contracts:
-            embed = discord.Embed(title="No Contracts", description="Something’s off—try again later!", color=0xFF3333)
-        else:
-            contract_text = "\n".join(f"**{c['task']}**: {c['progress']}/{c['goal']} (Reward: {c['reward']} {ZENTRON_EMOJI} & {c['item']}) - {max(0, (c['start_time'] + 21600 - now) // 3600)}h left" for c in contracts)
-            embed = discord.Embed(title=f"{enterprise['industry']} Tech Contracts", description=contract_text, color=0x00FFAA)
-            embed.set_footer(text="Complete within 6 hours from reset!")
-        await send_with_retry(interaction, embed=embed)
+        reply = await db.run(handle_contracts, str(interaction.user.id))
+        await send_with_retry(interaction, **reply)
 
     @app_commands.command(name="top", description="Check the Zentron kings")
-    async def top(self, interaction: discord.Interaction):
+    @app_commands.describe(page="Leaderboard page", scope="This server (default) or everyone")
+    @app_commands.choices(scope=[app_commands.Choice(name="server", value="server"), app_commands.Choice(name="global", value="global")])
+    async def top(self, interaction: discord.Interaction, page: app_commands.Range[int, 1] = 1, scope: str = "server"):
         await interaction.response.defer(thinking=True)
-        cursor.execute('SELECT user_id, balance, bank FROM users ORDER BY (balance + bank) DESC LIMIT 5')
-        top_players = cursor.fetchall()
-        leaderboard = [f"{i+1}. {interaction.guild.get_member(int(user_id)).name if interaction.guild.get_member(int(user_id)) else 'Unknown User'} - {balance + bank} {ZENTRON_EMOJI} ({get_title(balance + bank)})" for i, (user_id, balance, bank) in enumerate(top_players)]
-        embed = discord.Embed(title="👑 Zentron Kings", description="\n".join(leaderboard) if leaderboard else "No kings yet!", color=0x00FFAA)
+        guild = interaction.guild
+        if scope == "global" or guild is None:
+            if page > 1:
+                embed = discord.Embed(title="No Such Page", description="The global board only has one page!", color=0xFF3333)
+                await send_with_retry(interaction, embed=embed, ephemeral=True)
+                return
+            start = 0
+            top_players = await db.run(fetch_top_players)
+        else:
+            start = (page - 1) * LEADERBOARD_PAGE_SIZE
+            record_member(str(guild.id), str(interaction.user.id))
+            top_players = await db.read(get_guild_leaderboard, str(guild.id), page)
+        names = await resolve_member_names(guild, [int(user_id) for user_id, _ in top_players])
+        rows = [f"{start + i + 1}. {names.get(int(user_id), 'Unknown User')} - {net_worth} {ZENTRON_EMOJI} ({get_title(net_worth)})" for i, (user_id, net_worth) in enumerate(top_players)]
+        embed = discord.Embed(title="👑 Zentron Kings", description="\n".join(rows) if rows else "No kings yet!", color=0x00FFAA)
+        if scope != "global" and guild is not None:
+            embed.set_footer(text=f"{guild.name} • Page {page}")
         await send_with_retry(interaction, embed=embed)
 
     @app_commands.command(name="claim-bonus", description="Snag some extra Zentrons")
     async def claim_bonus(self, interaction: discord.Interaction):
         await interaction.response.defer(thinking=True)
-        user_id = str(interaction.user.id)
-        tax_pool = get_tax_pool()
-        enterprise = get_enterprise(user_id)
-        
-        if not enterprise:
-            embed = discord.Embed(title="No Empire", description="Need an enterprise to claim bonuses!", color=0xFF3333)
-            await send_with_retry(interaction, embed=embed)
-            return
-        
-        bonus = min(tax_pool // 10, 50)
-        if bonus <= 0:
-            embed = discord.Embed(title="No Loot", description="Tax pool’s dry. Check later!", color=0xFF3333)
-            await send_with_retry(interaction, embed=embed)
-            return
-        
-        set_balance(user_id, get_balance(user_id) + bonus)
-        set_tax_pool(tax_pool - bonus)
-        embed = discord.Embed(title="Bonus Snagged", description=f"Grabbed {bonus} {ZENTRON_EMOJI} from the pool!", color=0x00FFAA)
-        await send_with_retry(interaction, embed=embed)
+        reply = await db.run(handle_claim_bonus, str(interaction.user.id))
+        await send_with_retry(interaction, **reply)
 
     @app_commands.command(name="nanopulse", description="Send a NanoPulse to a mate")
     @app_commands.describe(target="Recipient")
     async def nanopulse(self, interaction: discord.Interaction, target: discord.User):
         await interaction.response.defer(thinking=True)
-        sender_id = str(interaction.user.id)
-        receiver_id = str(target.id)
-        now = datetime.utcnow().date().isoformat()
-        last_reset = get_last_nanopulse_reset(sender_id)
-        
-        if sender_id == receiver_id:
-            response = "Self-Pulse? You can’t NanoPulse yourself, yaar!"
-            await send_with_retry(interaction, response, ephemeral=True)
-            return
-        
-        if last_reset != now:
-            set_nanopulse_count(sender_id, 0)
-            set_last_nanopulse_reset(sender_id, now)
-        
-        count = get_nanopulse_count(sender_id)
-        if count >= NANOPULSE_LIMIT:
-            response = "Pulse Limit! You’ve sent 3 NanoPulses today! Reset at midnight UTC."
-            await send_with_retry(interaction, response, ephemeral=True)
-            return
-        
-        set_nanopulse_count(sender_id, count + 1)
-        set_balance(receiver_id, get_balance(receiver_id) + 10)
-        response = f"NanoPulse Sent! You pulsed {target.name} with a NanoPulse! They got 10 {ZENTRON_EMOJI}. ({NANOPULSE_LIMIT - count - 1} left today)"
-        
-        challenges = check_and_refresh_challenges(sender_id, now)
-        for challenge in challenges:
-            if challenge["progress_key"] == "nanopulse_count":
-                challenge["progress"] = min(challenge["progress"] + 1, challenge["goal"])
-                logger.info(f"Updated nanopulse_count for {sender_id}: {challenge['progress']}/{challenge['goal']}")
-                if challenge["progress"] >= challenge["goal"]:
-                    set_balance(sender_id, get_balance(sender_id) + challenge["reward"])
-                    response += f"\nChallenge Complete: Finished '{challenge['task']}'! +{challenge['reward']} {ZENTRON_EMOJI}"
-                    challenges.remove(challenge)
-        set_challenges(sender_id, challenges)
-        
-        contracts = check_and_refresh_contracts(sender_id, now)
-        now_ts = int(datetime.utcnow().timestamp())
-        for contract in contracts:
-            if contract["progress_key"] == "nanopulse_count":
-                contract["progress"] = min(contract["progress"] + 1, contract["goal"])
-                if contract["progress"] >= contract["goal"] and now_ts < contract["start_time"] + 21600:
-                    set_balance(sender_id, get_balance(sender_id) + contract["reward"])
-                    add_to_inventory(sender_id, contract["item"])
-                    response += f"\nContract Complete: Finished '{contract['task']}'! +{contract['reward']} {ZENTRON_EMOJI} & {contract['item']}"
-                    contracts.remove(contract)
-        set_contracts(sender_id, contracts)
-        
-        await send_with_retry(interaction, response)
+        reply = await db.run(handle_nanopulse, str(interaction.user.id), str(target.id), target.name)
+        await send_with_retry(interaction, **reply)
 
     @app_commands.command(name="setup-updates", description="Set up the zentrix-updates channel (Admin only)")
     async def setup_updates(self, interaction: discord.Interaction):
@@ -170,10 +243,18 @@ class Extras(commands.Cog):
         channel = discord.utils.get(guild.text_channels, name="zentrix-updates")
         if not channel:
             channel = await guild.create_text_channel("zentrix-updates")
-        set_updates_channel(str(guild.id), str(channel.id))
+        await db.run(set_updates_channel, str(guild.id), str(channel.id))
+        guild_config.set_updates_channel(str(guild.id), str(channel.id))  # Our copy, in case that ran in the cluster's storage process
         embed = discord.Embed(title="Updates Channel Set", description=f"Set {channel.name} as the updates channel!", color=0x00FFAA)
         await send_with_retry(interaction, embed=embed, ephemeral=True)
 
+    @app_commands.command(name="debug-stats", description="SQL and cache stats per command (Admin only)")
+    async def debug_stats(self, interaction: discord.Interaction):
+        if not any(role.permissions.administrator for role in getattr(interaction.user, "roles", [])):
+            await send_with_retry(interaction, content="Only admins can see debug stats!", ephemeral=True)
+            return
+        await send_with_retry(interaction, embed=render_debug_stats(await db.read(collect_debug_stats)), ephemeral=True)
+
     @app_commands.command(name="help", description="Get the Zentrix rundown")
     async def help(self, interaction: discord.Interaction):
         await interaction.response.defer(thinking=True)
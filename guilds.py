@@ -0,0 +1,30 @@
+class GuildConfigCache:
+    # server_config mirrored in memory: loaded once at startup, kept current by the functions that write it, so surge
+    # and updates-channel lookups are dict reads. Each guild's entry is replaced whole, never edited, so the loop thread
+    # can read while the database thread writes.
+    def __init__(self):
+        self.guilds = {}  # guild_id -> (updates_channel_id, surge_end, surge_multiplier)
+
+    def load(self, rows):
+        # rows: (guild_id, updates_channel_id, surge_active, surge_end, surge_multiplier)
+        self.guilds = {guild_id: (channel_id, surge_end if surge_active else 0, surge_multiplier or 1.0)
+                       for guild_id, channel_id, surge_active, surge_end, surge_multiplier in rows}
+
+    def set_updates_channel(self, guild_id: str, channel_id: str):
+        _, surge_end, multiplier = self.guilds.get(guild_id, (None, 0, 1.0))
+        self.guilds[guild_id] = (channel_id, surge_end, multiplier)
+
+    def start_surge(self, guild_id: str, surge_end: int, multiplier: float):
+        # Only guilds that already have a server_config row get a surge (same as the UPDATE behind it)
+        if guild_id in self.guilds:
+            self.guilds[guild_id] = (self.guilds[guild_id][0], surge_end, multiplier)
+
+    def updates_channel(self, guild_id: str) -> str:
+        config = self.guilds.get(guild_id)
+        return config[0] if config else None
+
+    def surge_multiplier(self, guild_id: str, now: int) -> float:
+        config = self.guilds.get(guild_id)
+        if config and now < (config[1] or 0):
+            return config[2]
+        return 1.0
@@ -0,0 +1,69 @@
+import threading
+
+
+class TopK:
+    # In-memory top of the net-worth ranking, kept current as balances change so /top never sorts the users table.
+    # Invariant: tracked entries are exactly the richest len(entries) users, and nobody untracked is worth more than `floor`.
+    def __init__(self, load, size: int = 5, depth: int = 20):
+        self.load = load  # load(limit) -> [(user_id, net_worth), ...] best first, from the net_worth index
+        self.size = size
+        self.depth = depth
+        self.entries = {}
+        self.floor = None
+        self.stale = True
+
+    def refill(self):
+        rows = self.load(self.depth)
+        self.entries = dict(rows)
+        # Fewer rows than asked for means there is nobody else to rank
+        self.floor = min(self.entries.values()) if len(rows) >= self.depth else float("-inf")
+        self.stale = False
+
+    def update(self, user_id: str, net_worth: int):
+        if self.stale:
+            return
+        if user_id in self.entries:
+            if net_worth >= self.floor:
+                self.entries[user_id] = net_worth
+                return
+            # Could now rank below someone we aren't tracking
+            del self.entries[user_id]
+            if len(self.entries) < self.size:
+                self.stale = True
+        elif net_worth > self.floor:
+            self.entries[user_id] = net_worth
+            if len(self.entries) > self.depth:
+                lowest = min(self.entries, key=self.entries.get)
+                self.floor = self.entries.pop(lowest)
+
+    def top(self, count: int = None) -> list:
+        if self.stale:
+            self.refill()
+        ranked = sorted(self.entries.items(), key=lambda entry: entry[1], reverse=True)
+        return ranked[:count or self.size]
+
+
+class PageCursors:
+    # Keyset bookmarks per guild: page -> (net_worth, user_id) of its last row, so page N resumes from the closest
+    # page already seen instead of re-reading every page before it. Bookmarks age out so rankings don't drift too far.
+    def __init__(self, ttl: int = 60, max_guilds: int = 1000):
+        self.ttl = ttl
+        self.max_guilds = max_guilds
+        self.guilds = {}
+        self.lock = threading.Lock()  # Shared by the reader threads
+
+    def nearest(self, guild_id: str, page: int, now: float) -> tuple:
+        with self.lock:
+            pages = self.guilds.get(guild_id)
+            if pages:
+                for known in range(page - 1, 0, -1):
+                    bookmark = pages.get(known)
+                    if bookmark and now - bookmark[1] < self.ttl:
+                        return known, bookmark[0]
+        return 0, None
+
+    def put(self, guild_id: str, page: int, cursor: tuple, now: float):
+        with self.lock:
+            if guild_id not in self.guilds and len(self.guilds) >= self.max_guilds:
+                self.guilds.pop(next(iter(self.guilds)))
+            self.guilds.setdefault(guild_id, {})[page] = (cursor, now)
@@ -0,0 +1,83 @@
+import logging
+import time
+
+logger = logging.getLogger('Zentrix')
+
+TAX_POOL_ACCOUNT = "tax_pool"  # Ledger account for the shared tax pool, next to the per-user accounts
+# Reasons that move money between accounts rather than minting or burning it; each must net to zero
+TRANSFER_REASONS = ("bank", "transfer", "rob", "claim_bonus")
+
+LEDGER_SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS ledger (id INTEGER PRIMARY KEY, ts INTEGER, user_id TEXT, delta INTEGER, reason TEXT, ref TEXT)''',
+    'CREATE INDEX IF NOT EXISTS idx_ledger_user ON ledger (user_id, id)',
+    # Net worth each account had when the auditor last looked at it
+    '''CREATE TABLE IF NOT EXISTS ledger_audit (user_id TEXT PRIMARY KEY, net_worth INTEGER, last_id INTEGER) WITHOUT ROWID''',
+    '''CREATE TABLE IF NOT EXISTS ledger_checkpoint (id INTEGER PRIMARY KEY, last_id INTEGER, total INTEGER, ts INTEGER)''',
+    'INSERT OR IGNORE INTO ledger_checkpoint (id, last_id, total, ts) VALUES (1, 0, 0, 0)',
+)
+
+
+class Ledger:
+    # Append-only record of every balance change. record() only buffers; write() is called from the user cache flush,
+    # so entries land in the same commit as the balances they explain.
+    def __init__(self):
+        self.pending = []
+
+    def record(self, user_id: str, delta: int, reason: str, ref: str = None):
+        if delta:
+            self.pending.append((int(time.time()), user_id, delta, reason, ref))
+
+    def mark(self) -> int:
+        return len(self.pending)
+
+    def rollback_to(self, mark: int):
+        del self.pending[mark:]
+
+    def write(self, storage) -> int:
+        # Caller commits; pending is only cleared once that succeeded (see written())
+        if self.pending:
+            storage.append_ledger(self.pending)
+        return len(self.pending)
+
+    def written(self, count: int):
+        del self.pending[:count]
+
+
+def audit_ledger(conn) -> dict:
+    # Incremental: only ledger rows after the last checkpoint (a rowid range), and only the accounts they touch.
+    cursor = conn.cursor()
+    last_id, total = cursor.execute('SELECT last_id, total FROM ledger_checkpoint WHERE id = 1').fetchone()
+    cursor.execute('''SELECT l.user_id, SUM(l.delta), MAX(l.id), a.net_worth,
+            CASE WHEN l.user_id = ? THEN (SELECT amount FROM tax_pool WHERE id = 1) ELSE (SELECT net_worth FROM users WHERE user_id = l.user_id) END
+        FROM ledger AS l LEFT JOIN ledger_audit AS a ON a.user_id = l.user_id
+        WHERE l.id > ? GROUP BY l.user_id''', (TAX_POOL_ACCOUNT, last_id))
+    accounts = cursor.fetchall()
+    cursor.execute('SELECT reason, SUM(delta), COUNT(*) FROM ledger WHERE id > ? GROUP BY reason', (last_id,))
+    by_reason = {reason: (amount, count) for reason, amount, count in cursor.fetchall()}
+    if accounts:
+        new_last_id = max(row[2] for row in accounts)
+        minted = sum(amount for amount, _ in by_reason.values())
+        cursor.executemany('INSERT INTO ledger_audit (user_id, net_worth, last_id) VALUES (?, ?, ?) ON CONFLICT(user_id) DO UPDATE SET net_worth = excluded.net_worth, last_id = excluded.last_id',
+                           [(user_id, actual or 0, max_id) for user_id, _, max_id, _, actual in accounts])
+        cursor.execute('UPDATE ledger_checkpoint SET last_id = ?, total = ?, ts = ? WHERE id = 1', (new_last_id, total + minted, int(time.time())))
+        conn.commit()
+    return report_audit([(user_id, delta, audited, actual) for user_id, delta, _, audited, actual in accounts], by_reason)
+
+
+def report_audit(accounts: list, by_reason: dict) -> dict:
+    # accounts: [(account, delta since the last audit, net worth then or None, net worth now)]; by_reason: reason -> (sum, count).
+    # For each account, audited net worth + new deltas must equal what's stored now; anything else moved money off the books.
+    if not accounts:
+        return {"entries": 0, "minted": 0, "by_reason": {}, "mismatches": [], "unbalanced": {}}
+    mismatches = []
+    for user_id, delta, audited, actual in accounts:
+        # First time we see an account there's nothing to compare with; its current value becomes the baseline
+        if audited is not None and audited + delta != (actual or 0):
+            mismatches.append((user_id, audited + delta, actual or 0))
+    unbalanced = {reason: by_reason[reason][0] for reason in TRANSFER_REASONS if reason in by_reason and by_reason[reason][0]}
+    for user_id, expected, actual in mismatches:
+        logger.warning(f"Ledger audit: {user_id} holds {actual}, ledger says {expected} ({actual - expected:+})")
+    for reason, amount in unbalanced.items():
+        logger.warning(f"Ledger audit: '{reason}' entries don't net to zero ({amount:+})")
+    return {"entries": sum(count for _, count in by_reason.values()), "minted": sum(amount for amount, _ in by_reason.values()),
+            "by_reason": by_reason, "mismatches": mismatches, "unbalanced": unbalanced}
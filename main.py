@@ -1,11 +1,34 @@
 import discord
 from discord.ext import commands, tasks
-import sqlite3
 import json
 import asyncio
 import logging
 from datetime import datetime
 import random
+import functools
+import math
+import os
+import signal
+import sys
+import time
+from contextlib import contextmanager
+from collections import deque
+from cache import UserCache, UserState
+from db import DatabaseExecutor
+from buffs import BuffBoard
+from guilds import GuildConfigCache
+from leaderboard import PageCursors, TopK
+from outbound import Broadcaster, ResponseDispatcher
+from scheduler import Scheduler
+from cluster import RemoteExecutor
+from tracing import SqlStats, task_label
+from metrics import Metrics, interaction_started
+from ledger import TAX_POOL_ACCOUNT, Ledger
+from profits import PROFIT_TICK, accrue
+from storage import MemoryStorage, SqliteStorage
+
+# Cogs do `from main import ...`; when run as a script, point that at this module so there's only one connection and cache
+sys.modules.setdefault('main', sys.modules[__name__])
 
 # Logging setup
 logging.basicConfig(level=logging.INFO)
@@ -15,43 +38,30 @@ logger = logging.getLogger('Zentrix')
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
-bot = commands.Bot(command_prefix='!', intents=intents)  # You can change the prefix or remove it if you only use slash commands
-
-# SQLite setup (keep this as is from Part 1)
-conn = sqlite3.connect('zentrix.db')
-cursor = conn.cursor()
-cursor.execute('''CREATE TABLE IF NOT EXISTS users (
-    user_id TEXT PRIMARY KEY, 
-    balance INTEGER, 
-    bank INTEGER,
-    last_work INTEGER, 
-    last_crime INTEGER, 
-    last_daily TEXT, 
-    daily_streak INTEGER,
-    inventory TEXT,
-    buffs TEXT,
-    last_buff INTEGER,
-    challenges TEXT,
-    nanopulse_count INTEGER,
-    last_nanopulse_reset TEXT,
-    contracts TEXT,
-    last_rob INTEGER
-)''')
-cursor.execute('''CREATE TABLE IF NOT EXISTS enterprises (user_id TEXT PRIMARY KEY, data TEXT)''')
-cursor.execute('''CREATE TABLE IF NOT EXISTS tax_pool (id INTEGER PRIMARY KEY, amount INTEGER)''')
-cursor.execute('''CREATE TABLE IF NOT EXISTS server_config (guild_id TEXT PRIMARY KEY, updates_channel_id TEXT, surge_active INTEGER, surge_end INTEGER, surge_multiplier REAL)''')
-cursor.execute('INSERT OR IGNORE INTO tax_pool (id, amount) VALUES (1, 0)')
-cursor.execute('UPDATE users SET inventory = ? WHERE inventory IS NULL', (json.dumps({}),))
-cursor.execute('UPDATE users SET buffs = ? WHERE buffs IS NULL', (json.dumps({}),))
-cursor.execute('UPDATE users SET last_buff = ? WHERE last_buff IS NULL', (0,))
-cursor.execute('UPDATE users SET challenges = ? WHERE challenges IS NULL', (json.dumps([]),))
-cursor.execute('UPDATE users SET nanopulse_count = ? WHERE nanopulse_count IS NULL', (0,))
-cursor.execute('UPDATE users SET last_nanopulse_reset = ? WHERE last_nanopulse_reset IS NULL', ('1970-01-01',))
-cursor.execute('UPDATE users SET bank = ? WHERE bank IS NULL', (0,))
-cursor.execute('UPDATE users SET contracts = ? WHERE contracts IS NULL', (json.dumps([]),))
-cursor.execute('UPDATE users SET last_rob = ? WHERE last_rob IS NULL', (0,))
-cursor.execute('UPDATE enterprises SET data = json_set(data, "$.profit_earned", 0) WHERE json_extract(data, "$.profit_earned") IS NULL')
-conn.commit()
+metrics = Metrics()  # Served on $PORT with a health check, see main()
+metrics.histogram("zentrix_command_seconds", "From the interaction reaching the bot to its response being sent, per command")
+metrics.histogram("zentrix_task_seconds", "Duration of one pass of a background loop or scheduled job")
+
+class TracedTree(discord.app_commands.CommandTree):
+    async def interaction_check(self, interaction) -> bool:
+        # Runs in the same task as the command, so everything the command does from here is counted under its name
+        command = interaction.command
+        sql_stats.start(f"/{command.qualified_name}" if command else "interaction")
+        interaction_started.set(time.monotonic())
+        return True
+
+# Set by cluster.py: "storage" owns the database and has no gateway, each "worker" runs some of the shards and sends its
+# database work to the storage process. Unset (python main.py), the whole bot is this one process
+CLUSTER_ROLE = os.environ.get("ZENTRIX_ROLE")
+IS_WORKER = CLUSTER_ROLE == "worker"
+
+# max_ratelimit_timeout: waits longer than this raise discord.RateLimited instead of sleeping inside the request, so senders can reschedule
+bot_options = dict(command_prefix='!', intents=intents, max_ratelimit_timeout=30.0, tree_cls=TracedTree)  # You can change the prefix or remove it if you only use slash commands
+if IS_WORKER:
+    bot = commands.AutoShardedBot(shard_ids=[int(shard) for shard in os.environ["ZENTRIX_SHARDS"].split(",")],
+                                  shard_count=int(os.environ["ZENTRIX_SHARD_COUNT"]), **bot_options)
+else:
+    bot = commands.Bot(**bot_options)
 
 # Constants (keep these from Part 1)
 ZENTRONS_START = 500
@@ -64,6 +74,18 @@ DAILY_BASE = 50
 BUFF_COOLDOWN = 3600
 NANOPULSE_LIMIT = 3
 ROB_COOLDOWN = 3600
+USER_CACHE_SIZE = 10000
+CACHE_FLUSH_INTERVAL = 5
+LEADERBOARD_SIZE = 5
+LEADERBOARD_PAGE_SIZE = 10
+ANNOUNCE_CONCURRENCY = 8
+ANNOUNCE_RATE = 40  # sends/s across all workers
+WAL_CHECKPOINT_INTERVAL = 60
+WAL_TRUNCATE_PAGES = 4000  # ~16MB of WAL before a checkpoint waits for readers so it can start over
+LEDGER_AUDIT_INTERVAL = 3600
+BUFF_EXPIRY_MAX_SLEEP = 300
+SQL_STATS_INTERVAL = 900
+SQL_SLOW_MS = float(os.environ.get("ZENTRIX_SQL_SLOW_MS", 100))  # Statements slower than this get logged
 ZENTRON_EMOJI = "<:Zentron:1344239317240905748>"
 # Enterprise tiers (super hard progression)
 TIERS = [
@@ -103,180 +125,299 @@ BUFFS = {
     "Secure Vault": {"multiplier": 1.0, "duration": 86400, "type": "anti_rob", "anti_rob": True}
 }
 
-# Challenges
+# Challenges. Users' rows store [id, progress] per active challenge, so ids must never be reused or renumbered
 CHALLENGES = [
-    {"task": "Earn 500 Zentrons", "goal": 500, "progress_key": "earned", "reward": 100},
-    {"task": "Use /work 5 times", "goal": 5, "progress_key": "work_count", "reward": 75},
-    {"task": "Use /crime 3 times", "goal": 3, "progress_key": "crime_count", "reward": 50},
-    {"task": "Invest in your enterprise", "goal": 1, "progress_key": "invest_count", "reward": 150},
-    {"task": "Send 2 NanoPulses", "goal": 2, "progress_key": "nanopulse_count", "reward": 60}
+    {"id": 1, "task": "Earn 500 Zentrons", "goal": 500, "progress_key": "earned", "reward": 100},
+    {"id": 2, "task": "Use /work 5 times", "goal": 5, "progress_key": "work_count", "reward": 75},
+    {"id": 3, "task": "Use /crime 3 times", "goal": 3, "progress_key": "crime_count", "reward": 50},
+    {"id": 4, "task": "Invest in your enterprise", "goal": 1, "progress_key": "invest_count", "reward": 150},
+    {"id": 5, "task": "Send 2 NanoPulses", "goal": 2, "progress_key": "nanopulse_count", "reward": 60}
 ]
 
-# Tech Contracts (Mini-Quests)
+# Tech Contracts (Mini-Quests). Stored as [id, progress, start_time]; same rule for ids
 CONTRACTS = {
     "Cybernetics": [
-        {"task": "Earn 2000 Zentrons from profit", "goal": 2000, "progress_key": "profit_earned", "reward": 500, "item": "Tech Relic"},
-        {"task": "Reach tier 3", "goal": 3, "progress_key": "tier_level", "reward": 300, "item": "NanoChip"}
+        {"id": 1, "task": "Earn 2000 Zentrons from profit", "goal": 2000, "progress_key": "profit_earned", "reward": 500, "item": "Tech Relic"},
+        {"id": 2, "task": "Reach tier 3", "goal": 3, "progress_key": "tier_level", "reward": 300, "item": "NanoChip"}
     ],
     "Quantum Computing": [
-        {"task": "Complete 5 challenges", "goal": 5, "progress_key": "challenges_completed", "reward": 400, "item": "Crypto Key"},
-        {"task": "Earn 1000 Zentrons total", "goal": 1000, "progress_key": "earned", "reward": 250, "item": "NanoChip"}
+        {"id": 3, "task": "Complete 5 challenges", "goal": 5, "progress_key": "challenges_completed", "reward": 400, "item": "Crypto Key"},
+        {"id": 4, "task": "Earn 1000 Zentrons total", "goal": 1000, "progress_key": "earned", "reward": 250, "item": "NanoChip"}
     ],
     "Nanotech": [
-        {"task": "Use /work 10 times", "goal": 10, "progress_key": "work_count", "reward": 350, "item": "NanoChip"},
-        {"task": "Earn 1500 Zentrons from /work", "goal": 1500, "progress_key": "work_earned", "reward": 400, "item": "Tech Relic"}
+        {"id": 5, "task": "Use /work 10 times", "goal": 10, "progress_key": "work_count", "reward": 350, "item": "NanoChip"},
+        {"id": 6, "task": "Earn 1500 Zentrons from /work", "goal": 1500, "progress_key": "work_earned", "reward": 400, "item": "Tech Relic"}
     ],
     "Dark Matter": [
-        {"task": "Earn 1000 Zentrons from /crime", "goal": 1000, "progress_key": "crime_earned", "reward": 450, "item": "Dark Cache"},
-        {"task": "Use /crime 7 times", "goal": 7, "progress_key": "crime_count", "reward": 300, "item": "Crypto Key"}
+        {"id": 7, "task": "Earn 1000 Zentrons from /crime", "goal": 1000, "progress_key": "crime_earned", "reward": 450, "item": "Dark Cache"},
+        {"id": 8, "task": "Use /crime 7 times", "goal": 7, "progress_key": "crime_count", "reward": 300, "item": "Crypto Key"}
     ],
     "AI Dynasties": [
-        {"task": "Send 5 NanoPulses", "goal": 5, "progress_key": "nanopulse_count", "reward": 350, "item": "NanoChip"},
-        {"task": "Reach tier 4", "goal": 4, "progress_key": "tier_level", "reward": 400, "item": "Tech Relic"}
+        {"id": 9, "task": "Send 5 NanoPulses", "goal": 5, "progress_key": "nanopulse_count", "reward": 350, "item": "NanoChip"},
+        {"id": 10, "task": "Reach tier 4", "goal": 4, "progress_key": "tier_level", "reward": 400, "item": "Tech Relic"}
     ]
 }
+CHALLENGE_TEMPLATES = {template["id"]: template for template in CHALLENGES}
+CONTRACT_TEMPLATES = {template["id"]: template for templates in CONTRACTS.values() for template in templates}
+
+sql_stats = SqlStats(SQL_SLOW_MS)  # Per-command SQL counts for /debug-stats; slow statements get logged
+
+# Storage: everything is kept through `storage` (see storage.py), which belongs to the database thread (see db.py), so all
+# writes go through db.run()/db.call(); read-only commands can use db.read() and the WAL reader pool instead.
+# ZENTRIX_BACKEND=memory keeps it all in dicts and saves nothing, for benchmarks and simulations
+STORAGE_BACKEND = os.environ.get("ZENTRIX_BACKEND", "sqlite")
+if IS_WORKER:
+    # Same run()/read()/call(), executed in the storage process; the module-level state below stays empty here
+    db = RemoteExecutor(os.environ["ZENTRIX_STORAGE"], bytes.fromhex(os.environ["ZENTRIX_STORAGE_KEY"]))
+    storage = None
+elif STORAGE_BACKEND == "memory":
+    db = DatabaseExecutor(None)
+    storage = MemoryStorage()
+else:
+    db = DatabaseExecutor('zentrix.db', factory=sql_stats.connection_factory())
+    storage = SqliteStorage(db.conn, db.reader)
+
+if not IS_WORKER:
+    # Rows from before template ids hold whole task dicts; setup() maps them back by task text
+    db.call(storage.setup, {template["task"]: template["id"] for template in CHALLENGES},
+            {template["task"]: template["id"] for template in CONTRACT_TEMPLATES.values()})
+
+# Columns a brand-new users row starts with
+USER_DEFAULTS = {
+    "balance": ZENTRONS_START,
+    "bank": 0,
+    "last_work": 0,
+    "last_crime": 0,
+    "last_daily": None,
+    "daily_streak": 0,
+    "inventory": json.dumps({}),
+    "buffs": json.dumps({}),
+    "last_buff": 0,
+    "challenges": json.dumps([]),
+    "nanopulse_count": 0,
+    "last_nanopulse_reset": '1970-01-01',
+    "contracts": json.dumps([]),
+    "last_rob": 0
+}
+ledger = Ledger()  # Buffered on the database thread, written by user_cache.flush()
+
+def settle_profit(state: UserState, live: bool):
+    # Lazy accrual: pay the hourly ticks an enterprise has earned since settled_at, when its owner is next touched.
+    # live=False is a reader's private copy: show the balance with profit included, record nothing
+    enterprise = state.enterprise
+    if enterprise is None:
+        return
+    ticks, net, tax = accrue(enterprise, state.buffs or {}, BUFFS, TAX_RATE, int(datetime.utcnow().timestamp()))
+    if not ticks:
+        return
+    enterprise["settled_at"] += ticks * PROFIT_TICK
+    enterprise["profit_earned"] = (enterprise["profit_earned"] or 0) + net
+    if not live:
+        state.balance += net
+        return
+    state.set_enterprise(enterprise)
+    ledger.record(state.user_id, net, "profit")
+    state.set("balance", state.balance + net)
+    ledger.record(TAX_POOL_ACCOUNT, tax, "tax")
+    storage.add_tax(tax)  # Goes out with the next flush
+    leaderboard.update(state.user_id, state.balance + state.bank)
+
+user_cache = UserCache(storage, USER_DEFAULTS, USER_CACHE_SIZE, ledger, settle_profit)  # Only touched from the database thread
+
+def load_top_net_worth(limit: int) -> list:
+    user_cache.flush()
+    return storage.top_net_worth(limit)
+
+leaderboard = TopK(load_top_net_worth, LEADERBOARD_SIZE, LEADERBOARD_SIZE * 4)  # Same thread rules as user_cache
+buff_board = BuffBoard(BUFFS)  # Same thread rules as user_cache
+
+def load_buff_board():
+    for user_id, buffs in storage.buffed_users():
+        buff_board.load(user_id, json.loads(buffs))
+    logger.info(f"Tracking buffs for {len(buff_board)} users")
+
+if not IS_WORKER:
+    db.call(load_buff_board)
+guild_config = GuildConfigCache()  # Read from any thread; written after the matching server_config change commits
+
+def fetch_guild_config() -> list:
+    return storage.guild_configs()
+
+# A worker keeps its own copy for finding updates channels; surges are applied by the handlers, in the storage process
+guild_config.load(db.call(fetch_guild_config))
+page_cursors = PageCursors()
+# (guild_id, user_id) pairs seen on the loop thread; the flush loop takes them in batches and stores them via db.run()
+pending_members = deque()
+
+def record_member(guild_id: str, user_id: str):
+    pending_members.append((guild_id, user_id))
+
+def take_members() -> list:
+    rows = []
+    while pending_members:
+        rows.append(pending_members.popleft())
+    return rows
+
+def store_members(rows: list) -> int:
+    if rows:
+        storage.add_members(rows)
+        storage.commit()
+    return len(rows)
+
+def sync_guild_members(guild_id: str, user_ids: list):
+    # Full member list from the gateway: replace whatever we had for this guild
+    storage.set_members(guild_id, user_ids)
+    storage.commit()
+
+def remove_guild_member(guild_id: str, user_id: str = None):
+    # No user_id: the bot left the guild, drop all of it
+    storage.remove_members(guild_id, user_id)
+    storage.commit()
+
+def with_owed_profit(rows: list) -> list:
+    # Profit accrues lazily, so ranked net worths leave out what enterprises earned since they last settled. Add it for
+    # just the rows being shown, from read-only snapshots (nothing is paid or committed), and re-rank them
+    rows = [(user_id, snapshot.balance + snapshot.bank) for user_id, snapshot in ((user_id, load_user_snapshot(user_id)) for user_id, _ in rows)]
+    return sorted(rows, key=lambda row: (-row[1], row[0]))
+
+def get_guild_leaderboard(guild_id: str, page: int) -> list:
+    # Runs on the reader pool (db.read), so it ranks committed data: at most CACHE_FLUSH_INTERVAL behind the cache
+    now = time.monotonic()
+    known, after = page_cursors.nearest(guild_id, page, now)
+    rows = []
+    for current in range(known + 1, page + 1):
+        rows = storage.reader().guild_page(guild_id, after, LEADERBOARD_PAGE_SIZE)
+        if not rows:
+            return []
+        after = (rows[-1][1], rows[-1][0])
+        page_cursors.put(guild_id, current, after, now)
+    return with_owed_profit(rows)
+
+@contextmanager
+def unit_of_work():
+    # Everything a command changes lands together or not at all. Cache edits become durable in a single flush; any direct
+    # SQL writes in the unit go out in that same commit. If the body raises, cached users and the open transaction roll back.
+    if user_cache.undo is not None:
+        yield  # Already inside one
+        return
+    user_cache.begin()
+    mark = ledger.mark()
+    try:
+        yield
+    except BaseException:
+        undo_unit(user_cache.undo, mark)
+        user_cache.end()
+        raise
+    # Done editing, so read-only handlers can go ahead; they don't wait on the flush and its fsync below
+    checkpoints = user_cache.end()
+    try:
+        if storage.in_transaction:
+            user_cache.flush()
+            storage.commit()
+    except BaseException:
+        undo_unit(checkpoints, mark)  # The cache goes back to how the unit found it, same as the database
+        raise
+    user_cache.evict()
+
+def undo_unit(checkpoints: dict, mark: int):
+    # Users back to their checkpoints, and the ledger entries and SQL writes made since `mark` dropped
+    user_cache.restore(checkpoints)
+    for user_id in checkpoints:
+        state = user_cache.peek(user_id)
+        if state is not None:
+            buff_board.load(user_id, state.buffs)
+    ledger.rollback_to(mark)
+    storage.rollback()
+    leaderboard.stale = True
+
+def transactional(fn):
+    # For command handlers: the whole call is one unit of work
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with unit_of_work():
+            return fn(*args, **kwargs)
+    return wrapper
+
 # Utility functions
+def load_user_snapshot(user_id: str) -> UserState:
+    # users row + enterprise, loaded together (one joined query on a cache miss); handlers read fields off this instead of calling each getter
+    # Read-only handlers (db.read) get a copy: don't mutate it. So does anything on the database thread outside a unit (the
+    # memory backend's reads, plain db.run() lookups), where a live settle would leave uncommitted writes for the next unit to roll back
+    if not db.on_db_thread():
+        return user_cache.read(user_id, storage.reader())
+    if user_cache.undo is None:
+        return user_cache.read(user_id, storage)  # The database thread has no reader connection of its own
+    return user_cache.get(user_id)
+
 def get_balance(user_id: str) -> int:
-    cursor.execute('SELECT balance FROM users WHERE user_id = ?', (user_id,))
-    result = cursor.fetchone()
-    if result is None:
-        set_balance(user_id, ZENTRONS_START)
-        return ZENTRONS_START
-    return result[0] if result[0] is not None else ZENTRONS_START
-
-def set_balance(user_id: str, amount: int):
-    last_work = get_last_work(user_id)
-    last_crime = get_last_crime(user_id)
-    last_daily, daily_streak = get_daily_info(user_id)
-    inventory = get_inventory(user_id)
-    buffs = get_buffs(user_id)
-    last_buff = get_last_buff(user_id)
-    challenges = get_challenges(user_id)
-    nanopulse_count = get_nanopulse_count(user_id)
-    last_nanopulse_reset = get_last_nanopulse_reset(user_id)
-    bank = get_bank(user_id)
-    contracts = get_contracts(user_id)
-    last_rob = get_last_rob(user_id)
-    cursor.execute('INSERT OR REPLACE INTO users (user_id, balance, last_work, last_crime, last_daily, daily_streak, inventory, buffs, last_buff, challenges, nanopulse_count, last_nanopulse_reset, bank, contracts, last_rob) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
-                   (user_id, amount, last_work, last_crime, last_daily, daily_streak, json.dumps(inventory), json.dumps(buffs), last_buff, json.dumps(challenges), nanopulse_count, last_nanopulse_reset, bank, json.dumps(contracts), last_rob))
-    conn.commit()
+    state = user_cache.get(user_id)
+    if not state.exists and "balance" not in state.dirty:
+        set_balance(user_id, ZENTRONS_START, "start")  # First read creates the row
+    return state.balance
+
+def set_balance(user_id: str, amount: int, reason: str = "adjust", ref: str = None):
+    # reason/ref end up in the ledger next to the change, e.g. ("transfer", <other user>) or ("challenge", <task>)
+    state = user_cache.get(user_id)
+    ledger.record(user_id, amount - state.balance, reason, ref)
+    state.set("balance", amount)
+    leaderboard.update(user_id, amount + state.bank)
+
+def credit_balance(user_id: str, credits: list):
+    # Several (amount, reason, ref) payouts as one balance change, each still its own ledger entry
+    state = user_cache.get(user_id)
+    for amount, reason, ref in credits:
+        ledger.record(user_id, amount, reason, ref)
+    state.set("balance", state.balance + sum(amount for amount, _, _ in credits))
+    leaderboard.update(user_id, state.balance + state.bank)
 
 def get_bank(user_id: str) -> int:
-    cursor.execute('SELECT bank FROM users WHERE user_id = ?', (user_id,))
-    result = cursor.fetchone()
-    return result[0] if result and result[0] is not None else 0
-
-def set_bank(user_id: str, amount: int):
-    balance = get_balance(user_id)
-    last_work = get_last_work(user_id)
-    last_crime = get_last_crime(user_id)
-    last_daily, daily_streak = get_daily_info(user_id)
-    inventory = get_inventory(user_id)
-    buffs = get_buffs(user_id)
-    last_buff = get_last_buff(user_id)
-    challenges = get_challenges(user_id)
-    nanopulse_count = get_nanopulse_count(user_id)
-    last_nanopulse_reset = get_last_nanopulse_reset(user_id)
-    contracts = get_contracts(user_id)
-    last_rob = get_last_rob(user_id)
-    cursor.execute('INSERT OR REPLACE INTO users (user_id, balance, last_work, last_crime, last_daily, daily_streak, inventory, buffs, last_buff, challenges, nanopulse_count, last_nanopulse_reset, bank, contracts, last_rob) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
-                   (user_id, balance, last_work, last_crime, last_daily, daily_streak, json.dumps(inventory), json.dumps(buffs), last_buff, json.dumps(challenges), nanopulse_count, last_nanopulse_reset, amount, json.dumps(contracts), last_rob))
-    conn.commit()
+    return user_cache.get(user_id).bank
+
+def set_bank(user_id: str, amount: int, reason: str = "bank", ref: str = None):
+    state = user_cache.get(user_id)
+    ledger.record(user_id, amount - state.bank, reason, ref)
+    state.set("bank", amount)
+    leaderboard.update(user_id, state.balance + amount)
 
 def get_last_work(user_id: str) -> int:
-    cursor.execute('SELECT last_work FROM users WHERE user_id = ?', (user_id,))
-    result = cursor.fetchone()
-    return result[0] if result and result[0] is not None else 0
+    return user_cache.get(user_id).last_work
 
 def set_last_work(user_id: str, timestamp: int):
-    balance = get_balance(user_id)
-    last_crime = get_last_crime(user_id)
-    last_daily, daily_streak = get_daily_info(user_id)
-    inventory = get_inventory(user_id)
-    buffs = get_buffs(user_id)
-    last_buff = get_last_buff(user_id)
-    challenges = get_challenges(user_id)
-    nanopulse_count = get_nanopulse_count(user_id)
-    last_nanopulse_reset = get_last_nanopulse_reset(user_id)
-    bank = get_bank(user_id)
-    contracts = get_contracts(user_id)
-    last_rob = get_last_rob(user_id)
-    cursor.execute('INSERT OR REPLACE INTO users (user_id, balance, last_work, last_crime, last_daily, daily_streak, inventory, buffs, last_buff, challenges, nanopulse_count, last_nanopulse_reset, bank, contracts, last_rob) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
-                   (user_id, balance, timestamp, last_crime, last_daily, daily_streak, json.dumps(inventory), json.dumps(buffs), last_buff, json.dumps(challenges), nanopulse_count, last_nanopulse_reset, bank, json.dumps(contracts), last_rob))
-    conn.commit()
+    user_cache.get(user_id).set("last_work", timestamp)
 
 def get_last_crime(user_id: str) -> int:
-    cursor.execute('SELECT last_crime FROM users WHERE user_id = ?', (user_id,))
-    result = cursor.fetchone()
-    return result[0] if result and result[0] is not None else 0
+    return user_cache.get(user_id).last_crime
 
 def set_last_crime(user_id: str, timestamp: int):
-    balance = get_balance(user_id)
-    last_work = get_last_work(user_id)
-    last_daily, daily_streak = get_daily_info(user_id)
-    inventory = get_inventory(user_id)
-    buffs = get_buffs(user_id)
-    last_buff = get_last_buff(user_id)
-    challenges = get_challenges(user_id)
-    nanopulse_count = get_nanopulse_count(user_id)
-    last_nanopulse_reset = get_last_nanopulse_reset(user_id)
-    bank = get_bank(user_id)
-    contracts = get_contracts(user_id)
-    last_rob = get_last_rob(user_id)
-    cursor.execute('INSERT OR REPLACE INTO users (user_id, balance, last_work, last_crime, last_daily, daily_streak, inventory, buffs, last_buff, challenges, nanopulse_count, last_nanopulse_reset, bank, contracts, last_rob) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
-                   (user_id, balance, last_work, timestamp, last_daily, daily_streak, json.dumps(inventory), json.dumps(buffs), last_buff, json.dumps(challenges), nanopulse_count, last_nanopulse_reset, bank, json.dumps(contracts), last_rob))
-    conn.commit()
+    user_cache.get(user_id).set("last_crime", timestamp)
 def get_daily_info(user_id: str) -> tuple:
-    cursor.execute('SELECT last_daily, daily_streak FROM users WHERE user_id = ?', (user_id,))
-    result = cursor.fetchone()
-    if result is None or result[0] is None:
+    state = user_cache.get(user_id)
+    if state.last_daily is None:
         return (None, 0)
-    return (result[0], result[1] if result[1] is not None else 0)
+    return (state.last_daily, state.daily_streak)
 
 def set_daily_info(user_id: str, last_daily: str, streak: int):
-    balance = get_balance(user_id)
-    last_work = get_last_work(user_id)
-    last_crime = get_last_crime(user_id)
-    inventory = get_inventory(user_id)
-    buffs = get_buffs(user_id)
-    last_buff = get_last_buff(user_id)
-    challenges = get_challenges(user_id)
-    nanopulse_count = get_nanopulse_count(user_id)
-    last_nanopulse_reset = get_last_nanopulse_reset(user_id)
-    bank = get_bank(user_id)
-    contracts = get_contracts(user_id)
-    last_rob = get_last_rob(user_id)
-    cursor.execute('INSERT OR REPLACE INTO users (user_id, balance, last_work, last_crime, last_daily, daily_streak, inventory, buffs, last_buff, challenges, nanopulse_count, last_nanopulse_reset, bank, contracts, last_rob) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
-                   (user_id, balance, last_work, last_crime, last_daily, streak, json.dumps(inventory), json.dumps(buffs), last_buff, json.dumps(challenges), nanopulse_count, last_nanopulse_reset, bank, json.dumps(contracts), last_rob))
-    conn.commit()
+    state = user_cache.get(user_id)
+    state.set("last_daily", last_daily)
+    state.set("daily_streak", streak)
 
 def get_inventory(user_id: str) -> dict:
-    cursor.execute('SELECT inventory FROM users WHERE user_id = ?', (user_id,))
-    result = cursor.fetchone()
-    return json.loads(result[0]) if result and result[0] is not None else {}
+    return user_cache.get(user_id).inventory
 
 def set_inventory(user_id: str, inventory: dict):
-    balance = get_balance(user_id)
-    last_work = get_last_work(user_id)
-    last_crime = get_last_crime(user_id)
-    last_daily, daily_streak = get_daily_info(user_id)
-    buffs = get_buffs(user_id)
-    last_buff = get_last_buff(user_id)
-    challenges = get_challenges(user_id)
-    nanopulse_count = get_nanopulse_count(user_id)
-    last_nanopulse_reset = get_last_nanopulse_reset(user_id)
-    bank = get_bank(user_id)
-    contracts = get_contracts(user_id)
-    last_rob = get_last_rob(user_id)
-    cursor.execute('INSERT OR REPLACE INTO users (user_id, balance, last_work, last_crime, last_daily, daily_streak, inventory, buffs, last_buff, challenges, nanopulse_count, last_nanopulse_reset, bank, contracts, last_rob) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
-                   (user_id, balance, last_work, last_crime, last_daily, daily_streak, json.dumps(inventory), json.dumps(buffs), last_buff, json.dumps(challenges), nanopulse_count, last_nanopulse_reset, bank, json.dumps(contracts), last_rob))
-    conn.commit()
+    user_cache.get(user_id).set("inventory", inventory)
 
 def add_to_inventory(user_id: str, item: str, amount: int = 1):
     inventory = get_inventory(user_id)
     inventory[item] = inventory.get(item, 0) + amount
     set_inventory(user_id, inventory)
 
+def add_items(user_id: str, items: list):
+    inventory = get_inventory(user_id)
+    for item in items:
+        inventory[item] = inventory.get(item, 0) + 1
+    set_inventory(user_id, inventory)
+
 def remove_from_inventory(user_id: str, item: str):
     inventory = get_inventory(user_id)
     if item in inventory and inventory[item] > 0:
@@ -288,233 +429,87 @@ def remove_from_inventory(user_id: str, item: str):
     return False
 
 def get_buffs(user_id: str) -> dict:
-    cursor.execute('SELECT buffs FROM users WHERE user_id = ?', (user_id,))
-    result = cursor.fetchone()
-    return json.loads(result[0]) if result and result[0] is not None else {}
+    return user_cache.get(user_id).buffs
 
 def set_buffs(user_id: str, buffs: dict):
-    balance = get_balance(user_id)
-    last_work = get_last_work(user_id)
-    last_crime = get_last_crime(user_id)
-    last_daily, daily_streak = get_daily_info(user_id)
-    inventory = get_inventory(user_id)
-    last_buff = get_last_buff(user_id)
-    challenges = get_challenges(user_id)
-    nanopulse_count = get_nanopulse_count(user_id)
-    last_nanopulse_reset = get_last_nanopulse_reset(user_id)
-    bank = get_bank(user_id)
-    contracts = get_contracts(user_id)
-    last_rob = get_last_rob(user_id)
-    cursor.execute('INSERT OR REPLACE INTO users (user_id, balance, last_work, last_crime, last_daily, daily_streak, inventory, buffs, last_buff, challenges, nanopulse_count, last_nanopulse_reset, bank, contracts, last_rob) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
-                   (user_id, balance, last_work, last_crime, last_daily, daily_streak, json.dumps(inventory), json.dumps(buffs), last_buff, json.dumps(challenges), nanopulse_count, last_nanopulse_reset, bank, json.dumps(contracts), last_rob))
-    conn.commit()
+    user_cache.get(user_id).set("buffs", buffs)
+    buff_board.load(user_id, buffs)
 def get_last_buff(user_id: str) -> int:
-    cursor.execute('SELECT last_buff FROM users WHERE user_id = ?', (user_id,))
-    result = cursor.fetchone()
-    return result[0] if result and result[0] is not None else 0
+    return user_cache.get(user_id).last_buff
 
 def set_last_buff(user_id: str, timestamp: int):
-    balance = get_balance(user_id)
-    last_work = get_last_work(user_id)
-    last_crime = get_last_crime(user_id)
-    last_daily, daily_streak = get_daily_info(user_id)
-    inventory = get_inventory(user_id)
-    buffs = get_buffs(user_id)
-    challenges = get_challenges(user_id)
-    nanopulse_count = get_nanopulse_count(user_id)
-    last_nanopulse_reset = get_last_nanopulse_reset(user_id)
-    bank = get_bank(user_id)
-    contracts = get_contracts(user_id)
-    last_rob = get_last_rob(user_id)
-    cursor.execute('INSERT OR REPLACE INTO users (user_id, balance, last_work, last_crime, last_daily, daily_streak, inventory, buffs, last_buff, challenges, nanopulse_count, last_nanopulse_reset, bank, contracts, last_rob) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
-                   (user_id, balance, last_work, last_crime, last_daily, daily_streak, json.dumps(inventory), json.dumps(buffs), timestamp, json.dumps(challenges), nanopulse_count, last_nanopulse_reset, bank, json.dumps(contracts), last_rob))
-    conn.commit()
+    user_cache.get(user_id).set("last_buff", timestamp)
 
 def apply_buff(user_id: str, buff_type: str) -> float:
-    buffs = get_buffs(user_id)
-    now = int(datetime.utcnow().timestamp())
-    multiplier = 1.0
-    for item, end_time in list(buffs.items()):
-        if now > end_time:
-            del buffs[item]
-        elif BUFFS[item]["type"] in [buff_type, "all"]:
-            multiplier *= BUFFS[item]["multiplier"]
-    set_buffs(user_id, buffs)
-    return multiplier
+    # Lookup only; lapsed buffs are cleared by expire_buffs()
+    return buff_board.multiplier(user_id, buff_type, int(datetime.utcnow().timestamp()))
 
 def is_anti_rob_active(user_id: str) -> bool:
-    buffs = get_buffs(user_id)
-    now = int(datetime.utcnow().timestamp())
-    for item, end_time in list(buffs.items()):
-        if now > end_time:
-            del buffs[item]
-        elif item == "Secure Vault" and BUFFS[item]["anti_rob"]:
-            return True
-    set_buffs(user_id, buffs)
-    return False
+    return buff_board.anti_rob(user_id, int(datetime.utcnow().timestamp()))
 
 def get_challenges(user_id: str) -> list:
-    cursor.execute('SELECT challenges FROM users WHERE user_id = ?', (user_id,))
-    result = cursor.fetchone()
-    return json.loads(result[0]) if result and result[0] is not None else []
+    return user_cache.get(user_id).challenges
 
 def set_challenges(user_id: str, challenges: list):
-    balance = get_balance(user_id)
-    last_work = get_last_work(user_id)
-    last_crime = get_last_crime(user_id)
-    last_daily, daily_streak = get_daily_info(user_id)
-    inventory = get_inventory(user_id)
-    buffs = get_buffs(user_id)
-    last_buff = get_last_buff(user_id)
-    nanopulse_count = get_nanopulse_count(user_id)
-    last_nanopulse_reset = get_last_nanopulse_reset(user_id)
-    bank = get_bank(user_id)
-    contracts = get_contracts(user_id)
-    last_rob = get_last_rob(user_id)
-    cursor.execute('INSERT OR REPLACE INTO users (user_id, balance, last_work, last_crime, last_daily, daily_streak, inventory, buffs, last_buff, challenges, nanopulse_count, last_nanopulse_reset, bank, contracts, last_rob) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
-                   (user_id, balance, last_work, last_crime, last_daily, daily_streak, json.dumps(inventory), json.dumps(buffs), last_buff, json.dumps(challenges), nanopulse_count, last_nanopulse_reset, bank, json.dumps(contracts), last_rob))
-    conn.commit()
-
-async def send_with_retry(interaction, content=None, embed=None, ephemeral=False):
-    retries = 3
-    delay = 5  # Start with 5-second delay
-    for attempt in range(retries):
-        try:
-            if interaction.response.is_done():
-                if embed:
-                    await interaction.followup.send(embed=embed, ephemeral=ephemeral)
-                else:
-                    await interaction.followup.send(content, ephemeral=ephemeral)
-            else:
-                if embed:
-                    await interaction.response.send_message(embed=embed, ephemeral=ephemeral)
-                else:
-                    await interaction.response.send_message(content, ephemeral=ephemeral)
-            return
-        except discord.errors.HTTPException as e:
-            if e.status == 429:  # Rate limit hit
-                logger.warning(f"Rate limit hit! Retrying in {delay} seconds... Attempt {attempt + 1}/{retries}")
-                await asyncio.sleep(delay)
-                delay *= 2  # Exponential backoff
-            else:
-                raise  # Other errors, let them fail
-    error_response = "Oops! I’m being rate limited by Discord. Try again in a bit!"
-    if interaction.response.is_done():
-        await interaction.followup.send(error_response, ephemeral=True)
-    else:
-        await interaction.response.send_message(error_response, ephemeral=True)
-def check_and_refresh_challenges(user_id: str, current_date: str) -> list:
-    challenges = get_challenges(user_id)
-    last_daily = get_daily_info(user_id)[0]
-    if not challenges or last_daily != current_date:
-        challenges = random.sample(CHALLENGES, 3)
-        for challenge in challenges:
-            challenge["progress"] = 0
+    user_cache.get(user_id).set("challenges", challenges)
+
+dispatcher = ResponseDispatcher()
+
+async def send_with_retry(interaction, content=None, embed=None, ephemeral=False) -> bool:
+    # Name kept for the cogs; waiting out rate limits (and giving up before the token dies) is the dispatcher's job
+    sent = await dispatcher.send(interaction, content, embed, ephemeral)
+    started = interaction_started.get()
+    if started is not None:
+        metrics.observe("zentrix_command_seconds", time.monotonic() - started, command=task_label.get())
+    return sent
+
+def challenges_need_refresh(state: UserState, current_date: str) -> bool:
+    return not state.challenges or state.last_daily != current_date
+
+def check_and_refresh_challenges(user_id: str, current_date: str, snapshot: UserState = None) -> list:
+    state = snapshot or user_cache.get(user_id)
+    challenges = state.challenges
+    if challenges_need_refresh(state, current_date):
+        challenges = [[template["id"], 0] for template in random.sample(CHALLENGES, 3)]
         set_challenges(user_id, challenges)
     return challenges
 
 def get_contracts(user_id: str) -> list:
-    cursor.execute('SELECT contracts FROM users WHERE user_id = ?', (user_id,))
-    result = cursor.fetchone()
-    return json.loads(result[0]) if result and result[0] is not None else []
+    return user_cache.get(user_id).contracts
 
 def set_contracts(user_id: str, contracts: list):
-    balance = get_balance(user_id)
-    last_work = get_last_work(user_id)
-    last_crime = get_last_crime(user_id)
-    last_daily, daily_streak = get_daily_info(user_id)
-    inventory = get_inventory(user_id)
-    buffs = get_buffs(user_id)
-    last_buff = get_last_buff(user_id)
-    challenges = get_challenges(user_id)
-    nanopulse_count = get_nanopulse_count(user_id)
-    last_nanopulse_reset = get_last_nanopulse_reset(user_id)
-    bank = get_bank(user_id)
-    last_rob = get_last_rob(user_id)
-    cursor.execute('INSERT OR REPLACE INTO users (user_id, balance, last_work, last_crime, last_daily, daily_streak, inventory, buffs, last_buff, challenges, nanopulse_count, last_nanopulse_reset, bank, contracts, last_rob) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
-                   (user_id, balance, last_work, last_crime, last_daily, daily_streak, json.dumps(inventory), json.dumps(buffs), last_buff, json.dumps(challenges), nanopulse_count, last_nanopulse_reset, bank, json.dumps(contracts), last_rob))
-    conn.commit()
-
-def check_and_refresh_contracts(user_id: str, current_date: str) -> list:
-    contracts = get_contracts(user_id)
-    enterprise = get_enterprise(user_id)
+    user_cache.get(user_id).set("contracts", contracts)
+
+def check_and_refresh_contracts(user_id: str, current_date: str, snapshot: UserState = None) -> list:
+    state = snapshot or user_cache.get(user_id)
+    contracts = state.contracts
+    enterprise = state.enterprise
     if not enterprise:
         return []
-    last_daily = get_daily_info(user_id)[0]
-    if not contracts or last_daily != current_date:
+    if not contracts or state.last_daily != current_date:
         industry_contracts = CONTRACTS[enterprise["industry"]]
-        contracts = random.sample(industry_contracts, min(3, len(industry_contracts)))
-        for contract in contracts:
-            contract["progress"] = 0
-            contract["start_time"] = int(datetime.utcnow().timestamp())
+        now = int(datetime.utcnow().timestamp())
+        contracts = [[template["id"], 0, now] for template in random.sample(industry_contracts, min(3, len(industry_contracts)))]
         set_contracts(user_id, contracts)
     return contracts
 
 def get_nanopulse_count(user_id: str) -> int:
-    cursor.execute('SELECT nanopulse_count FROM users WHERE user_id = ?', (user_id,))
-    result = cursor.fetchone()
-    return result[0] if result and result[0] is not None else 0
+    return user_cache.get(user_id).nanopulse_count
 
 def set_nanopulse_count(user_id: str, count: int):
-    balance = get_balance(user_id)
-    last_work = get_last_work(user_id)
-    last_crime = get_last_crime(user_id)
-    last_daily, daily_streak = get_daily_info(user_id)
-    inventory = get_inventory(user_id)
-    buffs = get_buffs(user_id)
-    last_buff = get_last_buff(user_id)
-    challenges = get_challenges(user_id)
-    last_nanopulse_reset = get_last_nanopulse_reset(user_id)
-    bank = get_bank(user_id)
-    contracts = get_contracts(user_id)
-    last_rob = get_last_rob(user_id)
-    cursor.execute('INSERT OR REPLACE INTO users (user_id, balance, last_work, last_crime, last_daily, daily_streak, inventory, buffs, last_buff, challenges, nanopulse_count, last_nanopulse_reset, bank, contracts, last_rob) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
-                   (user_id, balance, last_work, last_crime, last_daily, daily_streak, json.dumps(inventory), json.dumps(buffs), last_buff, json.dumps(challenges), count, last_nanopulse_reset, bank, json.dumps(contracts), last_rob))
-    conn.commit()
+    user_cache.get(user_id).set("nanopulse_count", count)
 
 def get_last_nanopulse_reset(user_id: str) -> str:
-    cursor.execute('SELECT last_nanopulse_reset FROM users WHERE user_id = ?', (user_id,))
-    result = cursor.fetchone()
-    return result[0] if result and result[0] is not None else '1970-01-01'
+    return user_cache.get(user_id).last_nanopulse_reset
 
 def set_last_nanopulse_reset(user_id: str, reset_date: str):
-    balance = get_balance(user_id)
-    last_work = get_last_work(user_id)
-    last_crime = get_last_crime(user_id)
-    last_daily, daily_streak = get_daily_info(user_id)
-    inventory = get_inventory(user_id)
-    buffs = get_buffs(user_id)
-    last_buff = get_last_buff(user_id)
-    challenges = get_challenges(user_id)
-    nanopulse_count = get_nanopulse_count(user_id)
-    bank = get_bank(user_id)
-    contracts = get_contracts(user_id)
-    last_rob = get_last_rob(user_id)
-    cursor.execute('INSERT OR REPLACE INTO users (user_id, balance, last_work, last_crime, last_daily, daily_streak, inventory, buffs, last_buff, challenges, nanopulse_count, last_nanopulse_reset, bank, contracts, last_rob) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
-                   (user_id, balance, last_work, last_crime, last_daily, daily_streak, json.dumps(inventory), json.dumps(buffs), last_buff, json.dumps(challenges), nanopulse_count, reset_date, bank, json.dumps(contracts), last_rob))
-    conn.commit()
+    user_cache.get(user_id).set("last_nanopulse_reset", reset_date)
 
 def get_last_rob(user_id: str) -> int:
-    cursor.execute('SELECT last_rob FROM users WHERE user_id = ?', (user_id,))
-    result = cursor.fetchone()
-    return result[0] if result and result[0] is not None else 0
+    return user_cache.get(user_id).last_rob
 
 def set_last_rob(user_id: str, timestamp: int):
-    balance = get_balance(user_id)
-    last_work = get_last_work(user_id)
-    last_crime = get_last_crime(user_id)
-    last_daily, daily_streak = get_daily_info(user_id)
-    inventory = get_inventory(user_id)
-    buffs = get_buffs(user_id)
-    last_buff = get_last_buff(user_id)
-    challenges = get_challenges(user_id)
-    nanopulse_count = get_nanopulse_count(user_id)
-    last_nanopulse_reset = get_last_nanopulse_reset(user_id)
-    bank = get_bank(user_id)
-    contracts = get_contracts(user_id)
-    cursor.execute('INSERT OR REPLACE INTO users (user_id, balance, last_work, last_crime, last_daily, daily_streak, inventory, buffs, last_buff, challenges, nanopulse_count, last_nanopulse_reset, bank, contracts, last_rob) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
-                   (user_id, balance, last_work, last_crime, last_daily, daily_streak, json.dumps(inventory), json.dumps(buffs), last_buff, json.dumps(challenges), nanopulse_count, last_nanopulse_reset, bank, json.dumps(contracts), timestamp))
-    conn.commit()
+    user_cache.get(user_id).set("last_rob", timestamp)
 
 def get_title(balance: int) -> str:
     for threshold, title in TITLES:
@@ -523,39 +518,29 @@ def get_title(balance: int) -> str:
     return "Rookie"
 
 def get_enterprise(user_id: str) -> dict:
-    cursor.execute('SELECT data FROM enterprises WHERE user_id = ?', (user_id,))
-    result = cursor.fetchone()
-    return json.loads(result[0]) if result and result[0] is not None else None
+    return user_cache.get(user_id).enterprise
 
 def set_enterprise(user_id: str, enterprise_data: dict):
-    cursor.execute('INSERT OR REPLACE INTO enterprises (user_id, data) VALUES (?, ?)', (user_id, json.dumps(enterprise_data)))
-    conn.commit()
+    user_cache.get(user_id).set_enterprise(enterprise_data)
 
 def get_tax_pool() -> int:
-    cursor.execute('SELECT amount FROM tax_pool WHERE id = 1')
-    result = cursor.fetchone()
-    return result[0] if result and result[0] is not None else 0
+    return storage.tax_pool()
 
-def set_tax_pool(amount: int):
-    cursor.execute('UPDATE tax_pool SET amount = ? WHERE id = 1', (amount,))
-    conn.commit()
+def set_tax_pool(amount: int, reason: str = "adjust", ref: str = None):
+    # Committed by the caller's unit of work
+    ledger.record(TAX_POOL_ACCOUNT, amount - get_tax_pool(), reason, ref)
+    storage.set_tax_pool(amount)
 
 def get_updates_channel(guild_id: str) -> str:
-    cursor.execute('SELECT updates_channel_id FROM server_config WHERE guild_id = ?', (guild_id,))
-    result = cursor.fetchone()
-    return result[0] if result and result[0] is not None else None
+    return guild_config.updates_channel(guild_id)
 
 def set_updates_channel(guild_id: str, channel_id: str):
-    cursor.execute('INSERT OR REPLACE INTO server_config (guild_id, updates_channel_id, surge_active, surge_end, surge_multiplier) VALUES (?, ?, COALESCE((SELECT surge_active FROM server_config WHERE guild_id = ?), 0), COALESCE((SELECT surge_end FROM server_config WHERE guild_id = ?), 0), COALESCE((SELECT surge_multiplier FROM server_config WHERE guild_id = ?), 1.0))', 
-                   (guild_id, channel_id, guild_id, guild_id, guild_id))
-    conn.commit()
+    storage.set_updates_channel(guild_id, channel_id)
+    storage.commit()
+    guild_config.set_updates_channel(guild_id, channel_id)
 
-async def get_surge_multiplier(guild_id: str) -> float:
-    cursor.execute('SELECT surge_active, surge_end, surge_multiplier FROM server_config WHERE guild_id = ?', (guild_id,))
-    result = cursor.fetchone()
-    if result and result[0] and int(datetime.utcnow().timestamp()) < result[1]:
-        return result[2]
-    return 1.0
+def get_surge_multiplier(guild_id: str) -> float:
+    return guild_config.surge_multiplier(guild_id, int(datetime.utcnow().timestamp()))
 
 # Load cogs and run bot
 async def setup_bot():
@@ -570,76 +555,341 @@ async def on_ready():
     logger.info(f'Zentrix activated as {bot.user} (ID: {bot.user.id})')
     await setup_bot()
     logger.info('Commands deployed globally')
+    for guild in bot.guilds:
+        await db.run(sync_guild_members, str(guild.id), [str(member.id) for member in guild.members])
+
+@bot.listen()
+async def on_interaction(interaction):
+    if interaction.guild_id is not None:
+        record_member(str(interaction.guild_id), str(interaction.user.id))
+
+@bot.listen()
+async def on_member_join(member):
+    record_member(str(member.guild.id), str(member.id))
+
+@bot.listen()
+async def on_member_remove(member):
+    await db.run(remove_guild_member, str(member.guild.id), str(member.id))
+
+@bot.listen()
+async def on_guild_join(guild):
+    await db.run(sync_guild_members, str(guild.id), [str(member.id) for member in guild.members])
+    schedule_surge(guild.id)
+
+@bot.listen()
+async def on_guild_remove(guild):
+    await db.run(remove_guild_member, str(guild.id))
+    await scheduler.remove(f"surge:{guild.id}")
 
 # Background tasks (keep from Part 6, but update to use bot instead of client)
-async def profit_cycle():
+# Each task awaits db.run() for its storage work, so the gateway keeps running while SQLite does I/O
+def settle_all_profits(user_ids: list = None) -> tuple:
+    # The rare background sweep: settles owners nobody has touched lately (or just `user_ids`), so idle balances and the
+    # tax pool don't drift too far behind. Cached users settle in memory; the rest in a few executemany statements
+    now = int(datetime.utcnow().timestamp())
+    mark = ledger.mark()
+    settled = {}  # Cached owners settled here, as they were before, so a failure can put them back
+    payouts = []
+    total_tax = 0
+    try:
+        with user_cache.lock:
+            for state in list(user_cache.states.values()):
+                enterprise = state.enterprise
+                if (enterprise is not None and enterprise["settled_at"] is not None and enterprise["settled_at"] <= now - PROFIT_TICK
+                        and (user_ids is None or state.user_id in user_ids)):
+                    settled[state.user_id] = state.checkpoint()
+                    settle_profit(state, True)
+        for user_id, buffs, row in storage.unsettled_enterprises(now - PROFIT_TICK, user_ids):
+            if user_cache.peek(user_id) is not None:
+                continue  # Settled above
+            enterprise = UserCache.decode_enterprise(row)
+            ticks, net, tax = accrue(enterprise, json.loads(buffs) if buffs else {}, BUFFS, TAX_RATE, now)
+            if ticks:
+                payouts.append((user_id, net, enterprise["settled_at"] + ticks * PROFIT_TICK))
+                ledger.record(user_id, net, "profit")
+                total_tax += tax
+        if payouts:
+            storage.pay_profits(payouts)
+            storage.add_tax(total_tax)
+            ledger.record(TAX_POOL_ACCOUNT, total_tax, "tax")
+        user_cache.flush()  # Cached settlements and the ledger, in the same commit
+        storage.commit()
+    except Exception:
+        undo_unit(settled, mark)
+        raise
+    if payouts:
+        leaderboard.stale = True
+    return len(payouts), total_tax
+
+def shift_enterprise_profits(shift: str, times: int = 1, due: float = None) -> int:
+    # Whole market in one UPDATE; cached enterprises get the same tweak in memory.
+    # Repeated shifts collapse: n dips are one dip of 5n, still floored at 5
+    # In cluster mode every worker runs the market_shift job so it can announce to its own guilds; `due` makes the shift
+    # itself happen once per cycle, whichever worker gets here first. Returns None for the others
+    if due is not None:
+        applied = storage.job_times().get("market_shift:applied")
+        if applied is not None and due - applied < EVENT_CYCLE / 2:
+            return None
+        storage.save_job_time("market_shift:applied", due)  # Commits with the shift
+    # Profit owed so far was earned at the old rates, so settle everyone first; this is also the daily sweep
+    paid, total_tax = settle_all_profits()
+    logger.info(f"Profit sweep: settled {paid} idle enterprises (tax: {total_tax})")
+    step = 5 * times
+    shifted = storage.shift_profits(step, shift == "dip")
+    storage.commit()
+    with user_cache.lock:
+        for state in user_cache.states.values():
+            if state.enterprise is not None:
+                profit = state.enterprise["profit"]
+                state.enterprise["profit"] = max(5, profit - step) if shift == "dip" else profit + step
+    return shifted
+
+broadcaster = Broadcaster(ANNOUNCE_CONCURRENCY, ANNOUNCE_RATE)
+
+def updates_channel_for(guild):
+    channel_id = get_updates_channel(str(guild.id))
+    return guild.get_channel(int(channel_id)) if channel_id else None
+
+async def announce(label: str, messages: dict):
+    # messages: guild_id -> text, sent to each guild's updates channel
+    sends = []
+    for guild in bot.guilds:
+        channel = updates_channel_for(guild) if guild.id in messages else None
+        if channel:
+            sends.append((channel, messages[guild.id]))
+    stats = await broadcaster.broadcast(label, sends)
+    logger.info(f"Broadcast {label}: {stats['delivered']}/{stats['targets']} delivered, {stats['failed']} failed, "
+                f"{stats['rate_limited']} rate limited, {stats['seconds']}s")
+    return stats
+
+async def market_shift(missed: int, due: float):
+    # Missed shifts all fell at the same hour of day, so they're the same kind; announced once
+    shift = "dip" if datetime.utcfromtimestamp(due).hour % 2 == 0 else "surge"
+    shifted = await db.run(shift_enterprise_profits, shift, missed, due)
+    if shifted is not None:
+        logger.info(f"Market shift: {shift} x{missed} applied to {shifted} enterprises")
+    message = f"📈 **Market Shift**: {shift.capitalize()} hits! Empire profits tweaked."
+    await announce("market_shift", {guild.id: message for guild in bot.guilds})
+
+def start_surges(surges: list):
+    # surges: [(guild_id, surge_end, multiplier)], all in one transaction
+    storage.start_surges(surges)
+    storage.commit()
+    for guild_id, surge_end, multiplier in surges:
+        guild_config.start_surge(guild_id, surge_end, multiplier)
+
+async def zentron_surge(due_jobs: list):
+    # Each guild rolls its own surges on its own timer, so they don't all land (and announce) in the same second.
+    # Surges that come due together, like every overdue one after a restart, start in one transaction and one broadcast
+    now = int(datetime.utcnow().timestamp())
+    surges = []
+    messages = {}
+    for name, _, _ in due_jobs:
+        guild_id = int(name.partition(":")[2])
+        duration = random.randint(3600, 7200)  # 1-2 hours
+        multiplier = 3.0 if random.random() < 0.05 else 2.0  # 5% chance for 3x, else 2x
+        surges.append((str(guild_id), now + duration, multiplier))
+        messages[guild_id] = f"⚡ **Zentron Surge!** All rewards x{multiplier} for {(duration // 3600)}h{(duration % 3600) // 60}m!"
+    await db.run(start_surges, surges)
+    await announce("zentron_surge", messages)
+
+def surge_gap() -> int:
+    return random.randint(43200, 86400) + 7200  # 12-24 hours after the last one ends
+
+def schedule_surge(guild_id: int):
+    # A surge that came due while we were down just starts now; there's nothing to catch up
+    scheduler.add(f"surge:{guild_id}", zentron_surge, surge_gap, first=surge_gap, group="surge")
+
+def load_job_times() -> dict:
+    return storage.job_times()
+
+def save_job_times(times: dict):
+    for name, next_run in times.items():
+        storage.save_job_time(name, next_run)
+    storage.commit()
+
+def delete_job_time(name: str):
+    storage.delete_job_time(name)
+    storage.commit()
+
+scheduler = Scheduler(db, load_job_times, save_job_times, delete_job_time, on_run=lambda name: sql_stats.start(name.partition(":")[0]),
+                      on_done=lambda name, seconds: metrics.observe("zentrix_task_seconds", seconds, task=name.partition(":")[0]))
+scheduler.add("market_shift", market_shift, EVENT_CYCLE)
+
+async def run_scheduler():
     await bot.wait_until_ready()
+    for guild in bot.guilds:
+        schedule_surge(guild.id)
+    await scheduler.run()
+
+async def ready():
+    # Background loops start once the bot is connected; the cluster's storage process has no gateway to wait for
+    if CLUSTER_ROLE != "storage":
+        await bot.wait_until_ready()
+
+@contextmanager
+def background_tick(name: str):
+    # One pass of a background loop: its SQL is counted under `name` and its duration goes to zentrix_task_seconds
+    sql_stats.start(name)
+    with metrics.timer("zentrix_task_seconds", task=name):
+        yield
+
+async def cache_flush_loop():
+    await ready()
     while not bot.is_closed():
-        total_tax = 0
-        cursor.execute('SELECT user_id, data FROM enterprises')
-        for user_id, data in cursor.fetchall():
-            enterprise = json.loads(data)
-            now = int(datetime.utcnow().timestamp())
-            profit = enterprise["profit"]
-            if enterprise["overclock_active"] and now < enterprise["overclock_end"]:
-                profit *= 3
-            elif now < enterprise["crash_end"]:
-                profit //= 2
-            profit = int(profit * apply_buff(user_id, "profit"))
-            tax = int(profit * TAX_RATE)
-            net_profit = profit - tax
-            current_balance = get_balance(user_id)
-            enterprise["profit_earned"] = enterprise.get("profit_earned", 0) + net_profit
-            set_enterprise(user_id, enterprise)
-            set_balance(user_id, current_balance + net_profit)
-            total_tax += tax
-            logger.info(f"Profit: {net_profit} Zentrons (tax: {tax}) to {user_id} from {enterprise['name']}")
-            await asyncio.sleep(1)  # 1-second delay per user
-        set_tax_pool(get_tax_pool() + total_tax)
-        await asyncio.sleep(3600)
-
-async def market_shift():
-    await bot.wait_until_ready()
+        await asyncio.sleep(CACHE_FLUSH_INTERVAL)
+        with background_tick("cache_flush"):
+            flushed = 0 if IS_WORKER else await db.run(user_cache.flush)
+            await db.run(store_members, take_members())
+        if flushed:
+            logger.debug(f"Flushed {flushed} cached users")
+
+def expire_buffs() -> int:
+    # Strip lapsed buffs from storage, once each: cached users in memory (written by the next flush), the rest in SQL
+    # A lapsed profit buff still counts toward the ticks before it ended, so owners are settled before it goes
+    expired = buff_board.due(int(datetime.utcnow().timestamp()))
+    rows = []
+    owners = {user_id for user_id, item, _ in expired if BUFFS[item]["type"] in ("profit", "all")}
+    if owners:
+        settle_all_profits(owners)
+    with user_cache.lock:
+        for user_id, item, end in expired:
+            state = user_cache.peek(user_id)
+            if state is None:
+                rows.append((user_id, item, end))
+            elif state.buffs.get(item) == end:
+                del state.buffs[item]
+                state.set("buffs", state.buffs)
+    if rows:
+        storage.remove_buffs(rows)
+        storage.commit()
+    return len(expired)
+
+async def buff_expiry_loop():
+    await ready()
     while not bot.is_closed():
-        shift = "dip" if datetime.utcnow().hour % 2 == 0 else "surge"
-        cursor.execute('SELECT user_id, data FROM enterprises')
-        for user_id, data in cursor.fetchall():
-            enterprise = json.loads(data)
-            enterprise["profit"] = max(5, enterprise["profit"] - 5) if shift == "dip" else enterprise["profit"] + 5
-            set_enterprise(user_id, enterprise)
-        for guild in bot.guilds:
-            channel_id = get_updates_channel(str(guild.id))
-            if channel_id:
-                channel = guild.get_channel(int(channel_id))
-                if channel:
-                    await channel.send(f"📈 **Market Shift**: {shift.capitalize()} hits! Empire profits tweaked.")
-        await asyncio.sleep(EVENT_CYCLE)
-
-async def zentron_surge():
-    await bot.wait_until_ready()
+        next_expiry = buff_board.next_expiry()
+        delay = BUFF_EXPIRY_MAX_SLEEP if next_expiry is None else next_expiry + 1 - datetime.utcnow().timestamp()
+        await asyncio.sleep(min(max(delay, 1), BUFF_EXPIRY_MAX_SLEEP))
+        with background_tick("buff_expiry"):
+            expired = await db.run(expire_buffs)
+        if expired:
+            logger.debug(f"Expired {expired} buffs")
+
+def run_ledger_audit() -> dict:
+    user_cache.flush()  # Balances and their ledger entries on disk together before comparing
+    return storage.audit_ledger()
+
+async def ledger_audit_loop():
+    await ready()
+    while not bot.is_closed():
+        await asyncio.sleep(LEDGER_AUDIT_INTERVAL)
+        with background_tick("ledger_audit"):
+            report = await db.run(run_ledger_audit)
+        logger.info(f"Ledger audit: {report['entries']} entries, {report['minted']:+} net, {len(report['mismatches'])} mismatched accounts")
+
+async def wal_checkpoint_loop():
+    # Autocheckpoint is off (see db.py); fold the WAL back into the main file here, off the writer thread
+    await ready()
     while not bot.is_closed():
-        await asyncio.sleep(random.randint(43200, 86400))  # 12-24 hours
-        for guild in bot.guilds:
-            now = int(datetime.utcnow().timestamp())
-            duration = random.randint(3600, 7200)  # 1-2 hours
-            multiplier = 3.0 if random.random() < 0.05 else 2.0  # 5% chance for 3x, else 2x
-            cursor.execute('UPDATE server_config SET surge_active = 1, surge_end = ?, surge_multiplier = ? WHERE guild_id = ?', 
-                           (now + duration, multiplier, str(guild.id)))
-            conn.commit()
-            channel_id = get_updates_channel(str(guild.id))
-            if channel_id:
-                channel = guild.get_channel(int(channel_id))
-                if channel:
-                    await channel.send(f"⚡ **Zentron Surge!** All rewards x{multiplier} for {(duration // 3600)}h{(duration % 3600) // 60}m!")
-        await asyncio.sleep(duration)
+        await asyncio.sleep(WAL_CHECKPOINT_INTERVAL)
+        with background_tick("wal_checkpoint"):
+            busy, wal_pages, moved = await db.checkpoint()
+            if wal_pages >= WAL_TRUNCATE_PAGES:
+                # A passive checkpoint never resets the WAL while readers keep snapshots open, so under steady reads it
+                # only grows; TRUNCATE waits (up to busy_timeout) for them to move on, then empties it
+                busy, wal_pages, moved = await db.checkpoint('TRUNCATE')
+                logger.info(f"WAL passed {WAL_TRUNCATE_PAGES} pages, truncated ({'busy' if busy else 'done'})")
+        if busy or moved < wal_pages:
+            logger.debug(f"WAL checkpoint partial: {moved}/{wal_pages} pages")
+
+async def sql_stats_loop():
+    await ready()
+    while not bot.is_closed():
+        await asyncio.sleep(SQL_STATS_INTERVAL)
+        window, seconds = sql_stats.take_window()
+        rows = sql_stats.summary(window, limit=5)
+        if rows:
+            logger.info(f"SQL in the last {seconds / 60:.0f}m: " + "; ".join(
+                f"{label} {statements} stmts/{runs} runs, {commits} commits, {ms}ms" + (f", {slow} slow" if slow else "")
+                for label, runs, statements, commits, ms, slow, _ in rows))
+
+@metrics.collector
+def collect_runtime() -> list:
+    # Read at scrape time, on the loop thread; counters here are plain ints the other threads only ever add to.
+    # A cluster worker has no database or cache of its own, so it only reports the Discord side
+    responses = dispatcher.metrics()
+    discord_side = [
+        ("zentrix_responses_total", "counter", "Interaction responses by outcome",
+         [({"outcome": outcome}, responses[outcome]) for outcome in ("sent", "failed", "expired", "rate_limited")]),
+        ("zentrix_response_queue_depth", "gauge", "Responses waiting on a rate limit", [({}, responses["queue_depth"])]),
+        ("zentrix_event_loop_lag_seconds_last", "gauge", "Most recent event loop lag sample", [({}, metrics.lag)]),
+        ("zentrix_guilds", "gauge", "Guilds the bot is in", [({}, len(bot.guilds))]),
+        ("zentrix_uptime_seconds", "gauge", "Seconds since the process started", [({}, round(time.time() - metrics.started))]),
+    ]
+    if IS_WORKER:
+        return discord_side
+    per_task = sql_stats.summary(limit=None)
+    lookups = user_cache.hits + user_cache.misses
+    return discord_side + [
+        ("zentrix_db_statements_total", "counter", "SQL statements executed, by command or task", [({"task": row[0]}, row[2]) for row in per_task]),
+        ("zentrix_db_commits_total", "counter", "Commits, by command or task", [({"task": row[0]}, row[3]) for row in per_task]),
+        ("zentrix_db_seconds_total", "counter", "Time spent executing SQL and committing, by command or task", [({"task": row[0]}, row[4] / 1000) for row in per_task]),
+        ("zentrix_db_slow_statements_total", "counter", f"Statements slower than {sql_stats.slow_ms:g}ms", [({"task": row[0]}, row[5]) for row in per_task]),
+        ("zentrix_user_cache_hits_total", "counter", "User cache lookups served from memory", [({}, user_cache.hits)]),
+        ("zentrix_user_cache_misses_total", "counter", "User cache lookups that loaded from SQLite", [({}, user_cache.misses)]),
+        ("zentrix_user_cache_hit_ratio", "gauge", "Hits over lookups since startup", [({}, round(user_cache.hits / lookups, 4) if lookups else 0)]),
+        ("zentrix_user_cache_users", "gauge", "Users held in the cache", [({}, len(user_cache))]),
+        ("zentrix_buffed_users", "gauge", "Users with an active buff", [({}, len(buff_board))]),
+    ]
+
+def health() -> tuple:
+    # Unhealthy once the client has closed or the loop is badly stuck; still starting up counts as healthy
+    ok = not bot.is_closed() and metrics.lag < 5
+    return ok, {"ready": bot.is_ready(), "latency": None if math.isnan(bot.latency) else round(bot.latency, 3), "loop_lag": round(metrics.lag, 3)}
 
 # Main execution
 async def main():
     async with bot:
-        bot.loop.create_task(profit_cycle())
-        bot.loop.create_task(market_shift())
-        bot.loop.create_task(zentron_surge())
-        await bot.start('MTM0Mzk3MjIyOTQ4MTc2Mjg5OA.GXSvO-.ixHx4L5sc_I2lUdJo6YyuhS9DnzAXB0q7gDZqc')  # Replace with your token
+        # Platforms that run this as a web process ($PORT, see Procfile) expect something to bind it
+        runner = await metrics.serve(int(os.environ["PORT"]), health) if os.environ.get("PORT") else None
+        bot.loop.create_task(metrics.watch_loop_lag())
+        bot.loop.create_task(run_scheduler())
+        bot.loop.create_task(cache_flush_loop())
+        if not IS_WORKER:  # A worker leaves these to the storage process, see run_storage()
+            for upkeep in storage_upkeep():
+                bot.loop.create_task(upkeep)
+        try:
+            await bot.start('MTM0Mzk3MjIyOTQ4MTc2Mjg5OA.GXSvO-.ixHx4L5sc_I2lUdJo6YyuhS9DnzAXB0q7gDZqc')  # Replace with your token
+        finally:
+            if runner is not None:
+                await runner.cleanup()
+            if not IS_WORKER:
+                db.call(user_cache.flush)  # Don't lose write-behind changes on shutdown
+            db.call(store_members, take_members())
+            db.close()
+
+def storage_upkeep() -> list:
+    return [wal_checkpoint_loop(), ledger_audit_loop(), buff_expiry_loop(), sql_stats_loop()]
+
+async def run_storage(server):
+    # Cluster mode's storage process (see cluster.py): the database and its upkeep, serving the workers until interrupted
+    loops = [asyncio.create_task(loop) for loop in (cache_flush_loop(), *storage_upkeep())]
+    server.start()
+    logger.info("Storage process ready")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        server.close()
+        for task in loops:
+            task.cancel()
+        db.call(user_cache.flush)
+        db.close()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    # Platform restarts send SIGTERM: stop like a Ctrl-C, so main()'s finally still flushes the cache and the ledger
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
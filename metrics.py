@@ -0,0 +1,130 @@
+import asyncio
+import bisect
+import contextvars
+import logging
+import time
+from contextlib import contextmanager
+
+from aiohttp import web
+
+logger = logging.getLogger('Zentrix')
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+# When the current interaction reached us (monotonic), set next to the SQL task label in interaction_check
+interaction_started = contextvars.ContextVar('interaction_started', default=None)
+
+
+class Histogram:
+    # Prometheus-style: counts per upper bound (cumulative when rendered), plus sum and count
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in labels.items()) + "}"
+
+
+class Metrics:
+    # Prometheus text exposition without a client library. Histograms are observed on the event loop and kept here;
+    # everything else is read from the live objects at scrape time by the registered collectors.
+    def __init__(self):
+        self.histograms = {}  # name -> (help, buckets, {labels tuple: Histogram})
+        self.collectors = []  # fn() -> [(name, type, help, [(labels dict, value)])]
+        self.lag = 0.0
+        self.started = time.time()
+        self.histogram("zentrix_event_loop_lag_seconds", "How late the event loop ran a 0.5s timer", LAG_BUCKETS)
+
+    def histogram(self, name: str, help: str, buckets: tuple = DEFAULT_BUCKETS):
+        self.histograms[name] = (help, buckets, {})
+
+    def observe(self, name: str, value: float, **labels):
+        _, buckets, series = self.histograms[name]
+        key = tuple(sorted(labels.items()))
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram(buckets)
+        histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - start, **labels)
+
+    def collector(self, fn):
+        self.collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        lines = []
+        for name, (help, buckets, series) in self.histograms.items():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, histogram in series.items():
+                labels = dict(key)
+                cumulative = 0
+                for bound, count in zip((*buckets, "+Inf"), histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{format_labels({**labels, 'le': bound})} {cumulative}")
+                lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+        for collect in self.collectors:
+            try:
+                families = collect()
+            except Exception:
+                logger.exception(f"Metrics collector {collect.__name__} failed")
+                continue
+            for name, kind, help, samples in families:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    async def watch_loop_lag(self, interval: float = 0.5):
+        # How late a plain sleep wakes up is how long everything else on the loop had to wait
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + interval
+            await asyncio.sleep(interval)
+            self.lag = max(0.0, loop.time() - expected)
+            self.observe("zentrix_event_loop_lag_seconds", self.lag)
+
+    async def serve(self, port: int, health) -> web.AppRunner:
+        # /health for the platform's checks, /metrics for Prometheus; health() -> (ok, details dict)
+        async def handle_health(request):
+            ok, details = health()
+            return web.json_response({"status": "ok" if ok else "unhealthy", **details}, status=200 if ok else 503)
+
+        async def handle_metrics(request):
+            return web.Response(body=self.render().encode(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+        app = web.Application()
+        app.router.add_get("/", handle_health)
+        app.router.add_get("/health", handle_health)
+        app.router.add_get("/metrics", handle_metrics)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, "0.0.0.0", port).start()
+        logger.info(f"Metrics and health check listening on :{port}")
+        return runner
@@ -0,0 +1,195 @@
+import asyncio
+import logging
+import time
+
+import discord
+
+logger = logging.getLogger('Zentrix')
+
+
+class Broadcaster:
+    # Fans an announcement out to many channels with a fixed number of workers. Sends are grouped by rate-limit bucket
+    # (channel.send buckets on the channel id), so one bucket's sends go in order while other buckets keep moving.
+    # A bucket told to back off is parked until its retry_after passes instead of holding a worker.
+    def __init__(self, workers: int = 8, per_second: float = 40, max_retries: int = 3):
+        self.workers = workers
+        self.interval = 1 / per_second  # Stay under Discord's ~50 requests/s global limit
+        self.max_retries = max_retries
+        self.next_slot = 0.0
+
+    async def pace(self):
+        now = time.monotonic()
+        wait = self.next_slot - now
+        self.next_slot = max(now, self.next_slot) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def broadcast(self, label: str, sends: list) -> dict:
+        # sends: [(channel, content)]; returns delivery stats for this one broadcast
+        buckets = {}
+        for channel, content in sends:
+            buckets.setdefault(channel.id, []).append((channel, content))
+        stats = {"label": label, "targets": len(sends), "delivered": 0, "failed": 0, "rate_limited": 0, "seconds": 0.0}
+        if not buckets:
+            return stats
+        started = time.monotonic()
+        queue = asyncio.PriorityQueue()  # (not_before, order, bucket); None bucket = stop
+        for order, bucket in enumerate(buckets):
+            queue.put_nowait((0.0, order, bucket))
+        retries = dict.fromkeys(buckets, 0)
+        remaining = [len(buckets)]
+        workers = min(self.workers, len(buckets))
+
+        def finish():
+            remaining[0] -= 1
+            if not remaining[0]:
+                for stop in range(workers):
+                    queue.put_nowait((float("inf"), len(buckets) + stop, None))
+
+        async def worker():
+            while True:
+                not_before, order, bucket = await queue.get()
+                if bucket is None:
+                    return
+                delay = not_before - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                pending = buckets[bucket]
+                while pending:
+                    channel, content = pending[0]
+                    await self.pace()
+                    try:
+                        await channel.send(content)
+                    except discord.RateLimited as e:
+                        retry_after = e.retry_after
+                    except Exception as e:
+                        # Anything but a 429 (Forbidden, a dropped connection, a timeout) fails this channel only
+                        if not isinstance(e, discord.HTTPException) or e.status != 429:
+                            logger.warning(f"Broadcast '{label}' to channel {channel.id} failed: {e!r}")
+                            stats["failed"] += 1
+                            pending.pop(0)
+                            continue
+                        retry_after = float(e.response.headers.get("Retry-After", 1))
+                    else:
+                        stats["delivered"] += 1
+                        pending.pop(0)
+                        continue
+                    stats["rate_limited"] += 1
+                    retries[bucket] += 1
+                    if retries[bucket] > self.max_retries:
+                        stats["failed"] += len(pending)
+                        pending.clear()
+                        break
+                    queue.put_nowait((time.monotonic() + retry_after, order, bucket))
+                    break
+                if not pending:
+                    finish()
+
+        running = [asyncio.create_task(worker()) for _ in range(workers)]
+        try:
+            await asyncio.gather(*running)
+        finally:
+            # If one worker dies anyway, the others would wait on the queue forever
+            for task in running:
+                task.cancel()
+        stats["seconds"] = round(time.monotonic() - started, 2)
+        return stats
+
+
+INTERACTION_TOKEN_TTL = 15 * 60  # Followups stop working this long after the interaction was created
+
+
+class ResponseDispatcher:
+    # Interaction replies, scheduled per route: sends on one route go in order, each at the earliest time Discord allows
+    # it, as learned from 429s (Retry-After / X-RateLimit-Reset-After, and the global flag). A send that couldn't
+    # happen before the interaction token expires is dropped straight away rather than parked.
+    def __init__(self, expiry_margin: float = 10):
+        self.expiry_margin = expiry_margin
+        self.blocked = {}  # route -> monotonic time it opens again
+        self.global_until = 0.0
+        self.locks = {}
+        self.queued = {}  # route -> sends waiting or in flight
+        self.depth = 0
+        self.stats = {"sent": 0, "failed": 0, "expired": 0, "rate_limited": 0, "wait_total": 0.0, "wait_max": 0.0}
+
+    @staticmethod
+    def route(interaction) -> tuple:
+        # The first response goes to the interaction callback, everything after it to the token's webhook
+        if not interaction.response.is_done():
+            return ("callback", interaction.id)
+        return ("webhook", interaction.application_id, interaction.token)
+
+    def deadline(self, interaction) -> float:
+        age = (discord.utils.utcnow() - interaction.created_at).total_seconds()
+        return time.monotonic() + INTERACTION_TOKEN_TTL - age - self.expiry_margin
+
+    def block(self, route: tuple, retry_after: float, is_global: bool = False):
+        until = time.monotonic() + retry_after
+        if is_global:
+            self.global_until = max(self.global_until, until)
+        else:
+            self.blocked[route] = max(self.blocked.get(route, 0.0), until)
+
+    def block_from_headers(self, route: tuple, headers):
+        retry_after = headers.get("Retry-After") or headers.get("X-RateLimit-Reset-After") or 1
+        self.block(route, float(retry_after), headers.get("X-RateLimit-Global") == "true")
+
+    def metrics(self) -> dict:
+        sent = self.stats["sent"]
+        return {**self.stats, "queue_depth": self.depth, "routes": len(self.queued),
+                "wait_avg": round(self.stats["wait_total"] / sent, 3) if sent else 0.0}
+
+    @staticmethod
+    async def deliver(interaction, content, embed, ephemeral):
+        if interaction.response.is_done():
+            if embed:
+                await interaction.followup.send(embed=embed, ephemeral=ephemeral)
+            else:
+                await interaction.followup.send(content, ephemeral=ephemeral)
+        elif embed:
+            await interaction.response.send_message(embed=embed, ephemeral=ephemeral)
+        else:
+            await interaction.response.send_message(content, ephemeral=ephemeral)
+
+    async def send(self, interaction, content=None, embed=None, ephemeral=False) -> bool:
+        # False if the reply was dropped because the token would expire first; other HTTP errors are raised
+        route = self.route(interaction)
+        deadline = self.deadline(interaction)
+        lock = self.locks.setdefault(route, asyncio.Lock())
+        self.queued[route] = self.queued.get(route, 0) + 1
+        self.depth += 1
+        started = time.monotonic()
+        try:
+            async with lock:
+                while True:
+                    ready = max(self.blocked.get(route, 0.0), self.global_until, time.monotonic())
+                    if ready > deadline:
+                        self.stats["expired"] += 1
+                        logger.warning(f"Dropping reply to interaction {interaction.id}: its token expires before Discord would take it")
+                        return False
+                    if ready > time.monotonic():
+                        await asyncio.sleep(ready - time.monotonic())
+                    try:
+                        await self.deliver(interaction, content, embed, ephemeral)
+                    except discord.RateLimited as e:
+                        self.block(route, e.retry_after)
+                    except discord.HTTPException as e:
+                        if e.status != 429:
+                            self.stats["failed"] += 1
+                            raise
+                        self.block_from_headers(route, e.response.headers)
+                    else:
+                        waited = time.monotonic() - started
+                        self.stats["sent"] += 1
+                        self.stats["wait_total"] += waited
+                        self.stats["wait_max"] = max(self.stats["wait_max"], waited)
+                        return True
+                    self.stats["rate_limited"] += 1
+        finally:
+            self.depth -= 1
+            self.queued[route] -= 1
+            if not self.queued[route]:
+                del self.queued[route]
+                self.locks.pop(route, None)
+                if self.blocked.get(route, 0.0) <= time.monotonic():
+                    self.blocked.pop(route, None)
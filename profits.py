@@ -0,0 +1,42 @@
+PROFIT_TICK = 3600  # Enterprises pay out once an hour, counted from their own settled_at
+
+
+def tick_rate(enterprise: dict, buffs: dict, catalog: dict, t: float) -> int:
+    # Gross profit of one tick at time t, same rules the hourly payout always used
+    profit = enterprise["profit"]
+    if enterprise["overclock_active"] and t < enterprise["overclock_end"]:
+        profit *= 3
+    elif t < enterprise["crash_end"]:
+        profit //= 2
+    multiplier = 1.0
+    for item, end in buffs.items():
+        buff = catalog.get(item)
+        if buff and t <= end and buff["type"] in ("profit", "all"):
+            multiplier *= buff["multiplier"]
+    return int(profit * multiplier)
+
+
+def accrue(enterprise: dict, buffs: dict, catalog: dict, tax_rate: float, now: float) -> tuple:
+    # Profit owed since settled_at, as (ticks, net, tax), without walking the ticks one by one. Anything that changes the
+    # rate (overclock, crash, buffs, tier) is settled before it's applied, so every window is a prefix of the unsettled
+    # span: the rate only changes where one of them ends, and each stretch in between is count * one tick's payout.
+    since = enterprise["settled_at"]
+    ticks = int((now - since) // PROFIT_TICK) if since is not None else 0
+    if ticks <= 0:
+        return 0, 0, 0
+    # Tick k (1-based) happens at since + k * PROFIT_TICK; find the first k each window no longer covers
+    cuts = {1, ticks + 1}
+    ends = [enterprise["overclock_end"] if enterprise["overclock_active"] else 0, enterprise["crash_end"]]
+    for end in ends:
+        cuts.add(-int(-(end - since) // PROFIT_TICK))  # t < end
+    for item, end in buffs.items():
+        if item in catalog:
+            cuts.add(int((end - since) // PROFIT_TICK) + 1)  # t <= end
+    cuts = sorted(k for k in cuts if 1 <= k <= ticks + 1)
+    net = tax = 0
+    for start, stop in zip(cuts, cuts[1:]):
+        gross = tick_rate(enterprise, buffs, catalog, since + start * PROFIT_TICK)
+        tick_tax = int(gross * tax_rate)
+        net += (gross - tick_tax) * (stop - start)
+        tax += tick_tax * (stop - start)
+    return ticks, net, tax
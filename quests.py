@@ -0,0 +1,80 @@
+import logging
+from datetime import datetime
+
+from main import ZENTRON_EMOJI, CHALLENGE_TEMPLATES, CONTRACT_TEMPLATES, UserState, check_and_refresh_challenges, check_and_refresh_contracts, set_challenges, set_contracts, credit_balance, add_items
+
+logger = logging.getLogger('Zentrix')
+
+CONTRACT_WINDOW = 21600  # Contracts only pay out within 6 hours of their reset
+# Stored entries are [template_id, progress] for challenges and [template_id, progress, start_time] for contracts
+PROGRESS, START_TIME = 1, 2
+# How an event moves a goal; anything not listed here is a counter and just adds up
+PROGRESS_RULES = {
+    "tier_level": max,
+}
+
+
+def advance(template: dict, entry: list, value) -> bool:
+    rule = PROGRESS_RULES.get(template["progress_key"])
+    progress = rule(entry[PROGRESS], value) if rule else entry[PROGRESS] + value
+    entry[PROGRESS] = min(progress, template["goal"])
+    return entry[PROGRESS] >= template["goal"]
+
+
+def index_by_key(entries: list, templates: dict) -> dict:
+    by_key = {}
+    for entry in entries:
+        template = templates.get(entry[0])
+        if template:
+            by_key.setdefault(template["progress_key"], []).append((template, entry))
+    return by_key
+
+
+def record_progress(user_id: str, events: dict, snapshot: UserState) -> list:
+    # One place for every command's challenge/contract progress. `events` maps progress_key -> amount, e.g.
+    # {"work_count": 1, "earned": 42}. Only goals keyed by those events are touched; rewards are paid in one balance
+    # change and one inventory write, and each list is saved once. Returns (title, text) lines for the reply.
+    today = datetime.utcnow().date().isoformat()
+    now = int(datetime.utcnow().timestamp())
+    completed = []
+    credits = []
+    items = []
+
+    challenges = check_and_refresh_challenges(user_id, today, snapshot)
+    done = set()  # id() of finished entries
+    by_key = index_by_key(challenges, CHALLENGE_TEMPLATES)
+    for key, value in events.items():
+        for template, entry in by_key.get(key, ()):
+            if id(entry) in done:
+                continue
+            finished = advance(template, entry, value)
+            logger.info(f"Updated {key} for {user_id}: {entry[PROGRESS]}/{template['goal']}")
+            if finished:
+                done.add(id(entry))
+                credits.append((template["reward"], "challenge", template["task"]))
+                completed.append(("Challenge Complete", f"Finished '{template['task']}'! +{template['reward']} {ZENTRON_EMOJI}"))
+    if by_key.keys() & events.keys():
+        set_challenges(user_id, [entry for entry in challenges if id(entry) not in done])
+    if done:
+        events = {**events, "challenges_completed": len(done)}  # Contracts can count finished challenges
+
+    contracts = check_and_refresh_contracts(user_id, today, snapshot)
+    done = set()
+    by_key = index_by_key(contracts, CONTRACT_TEMPLATES)
+    for key, value in events.items():
+        for template, entry in by_key.get(key, ()):
+            if id(entry) in done:
+                continue
+            if advance(template, entry, value) and now < entry[START_TIME] + CONTRACT_WINDOW:
+                done.add(id(entry))
+                credits.append((template["reward"], "contract", template["task"]))
+                items.append(template["item"])
+                completed.append(("Contract Complete", f"Finished '{template['task']}'! +{template['reward']} {ZENTRON_EMOJI} & {template['item']}"))
+    if by_key.keys() & events.keys():
+        set_contracts(user_id, [entry for entry in contracts if id(entry) not in done])
+
+    if credits:
+        credit_balance(user_id, credits)
+    if items:
+        add_items(user_id, items)
+    return completed
@@ -0,0 +1,118 @@
+import asyncio
+import heapq
+import logging
+import time
+
+logger = logging.getLogger('Zentrix')
+
+
+class Scheduler:
+    # Periodic jobs on one timer heap. Next-run times are stored (via the load/save functions, run on the database
+    # thread), so a restart picks the timing back up. A fixed-interval job that was due while we were down runs once with
+    # the number of periods it missed, so it can catch up in bulk. Jobs in a group that come due together (say, every
+    # guild's overdue surge after a restart) run as one batch.
+    def __init__(self, db, load_times, save_times, delete_time, on_run=None, on_done=None):
+        self.db = db
+        self.load_times = load_times  # () -> {name: next_run}
+        self.save_times = save_times  # ({name: next_run})
+        self.delete_time = delete_time  # (name)
+        self.on_run = on_run  # Optional on_run(name), called in the job's own task just before it runs; a batch passes its group
+        self.on_done = on_done  # Optional on_done(name, seconds) once it's finished, failed or not
+        self.jobs = {}  # name -> (handler, every, first, group)
+        self.next_runs = {}
+        self.heap = []  # (next_run, name); stale entries are skipped
+        self.stored = {}
+        self.wakeup = None
+        self.started = False
+        self.running = set()  # Tasks for jobs being fired; asyncio only keeps weak references to them
+
+    def add(self, name: str, handler, every, first=0, group: str = None):
+        # handler(missed, due) is a coroutine function. every/first: seconds, or a callable returning seconds for jitter.
+        # Only fixed intervals are caught up; a job with a random interval just runs once when it's late.
+        # With a group, the handler is called once per batch instead: handler([(name, missed, due), ...]).
+        # Jobs added after start are stored once they first run.
+        if name in self.jobs:
+            return
+        self.jobs[name] = (handler, every, first, group)
+        if self.started:
+            self.schedule(name, self.stored.get(name))
+
+    async def remove(self, name: str):
+        # The stored time goes too, so if the job is added again (a guild rejoining) it starts fresh instead of firing
+        # straight away on the old timer
+        self.jobs.pop(name, None)
+        self.next_runs.pop(name, None)
+        self.stored.pop(name, None)
+        await self.db.run(self.delete_time, name)
+
+    def schedule(self, name: str, next_run) -> float:
+        if next_run is None:
+            first = self.jobs[name][2]
+            next_run = time.time() + (first() if callable(first) else first)
+        self.next_runs[name] = next_run
+        heapq.heappush(self.heap, (next_run, name))
+        if self.wakeup:
+            self.wakeup.set()
+        return next_run
+
+    async def run(self):
+        self.wakeup = asyncio.Event()
+        self.stored = await self.db.run(self.load_times)
+        for name in self.jobs:
+            self.schedule(name, self.stored.get(name))
+        self.started = True
+        while True:
+            self.wakeup.clear()
+            batches = {}  # group (or the job's own name) -> [(name, due)]
+            while self.heap and (self.heap[0][0] <= time.time() or self.next_runs.get(self.heap[0][1]) != self.heap[0][0]):
+                due, name = heapq.heappop(self.heap)
+                if self.next_runs.get(name) == due:
+                    batches.setdefault(self.jobs[name][3] or name, []).append((name, due))
+            for batch in batches.values():
+                task = asyncio.create_task(self.fire(batch))
+                self.running.add(task)
+                task.add_done_callback(self.running.discard)
+            delay = self.heap[0][0] - time.time() if self.heap else 3600
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), max(delay, 0))
+            except asyncio.TimeoutError:
+                pass
+
+    async def fire(self, batch: list):
+        runs = []  # (name, missed, due, next_run)
+        now = time.time()
+        for name, due in batch:
+            if name not in self.jobs:
+                continue
+            _, every, _, _ = self.jobs[name]
+            if callable(every):
+                missed = 1
+                next_run = now + every()
+            else:
+                missed = 1 + int((now - due) // every)
+                next_run = due + missed * every  # Stay on the original phase
+            self.next_runs[name] = next_run
+            runs.append((name, missed, due, next_run))
+        if not runs:
+            return
+        handler, _, _, group = self.jobs[runs[0][0]]
+        label = group or runs[0][0]
+        if self.on_run:
+            self.on_run(label)
+        start = time.monotonic()
+        try:
+            if group:
+                await handler([(name, missed, due) for name, missed, due, _ in runs])
+            else:
+                await handler(runs[0][1], runs[0][2])
+        except Exception:
+            logger.exception(f"Scheduled job {label} failed")
+        if self.on_done:
+            self.on_done(label, time.monotonic() - start)
+        # Saved after the run: a crash mid-job repeats it on restart rather than skipping it
+        times = {name: next_run for name, _, _, next_run in runs if self.next_runs.get(name) == next_run}
+        if times:
+            await self.db.run(self.save_times, times)
+            for name, next_run in times.items():
+                heapq.heappush(self.heap, (next_run, name))
+            self.wakeup.set()
@@ -0,0 +1,476 @@
+import functools
+import heapq
+import json
+import logging
+from datetime import datetime
+from typing import Protocol
+
+from cache import ENTERPRISE_COLUMNS, USER_COLUMNS
+from ledger import LEDGER_SCHEMA, TAX_POOL_ACCOUNT, audit_ledger, report_audit
+
+logger = logging.getLogger('Zentrix')
+
+# Where users, enterprises, guild config, the tax pool (and the bookkeeping around them) are kept. main.py picks one at
+# startup; everything else goes through `storage` and never sees SQL.
+# Rows are tuples in USER_COLUMNS / ENTERPRISE_COLUMNS order with the values as stored (JSON columns as text).
+# Writes only stage: the caller commits, so several of them can land together. Everything runs on the database thread,
+# except what goes through reader(), which serves db.read().
+
+
+class Storage(Protocol):
+    def setup(self, challenge_ids: dict, contract_ids: dict): ...  # Create or migrate whatever it needs, once at startup; *_ids: task text -> template id
+    def reader(self) -> "Storage": ...  # The same data for a read-only handler, from whichever thread it runs on
+    @property
+    def in_transaction(self) -> bool: ...
+    def commit(self): ...
+    def rollback(self): ...
+
+    # Users and enterprises
+    def load_user(self, user_id: str) -> tuple: ...  # (user row or None, enterprise row or None)
+    def save_users(self, columns: tuple, rows: list): ...  # [(user_id, *row)]: new users get the whole row, existing ones `columns`
+    def save_enterprises(self, rows: list): ...  # [(user_id, *row)]
+    def top_net_worth(self, limit: int) -> list: ...  # [(user_id, net_worth)], richest first
+    def guild_page(self, guild_id: str, after: tuple, limit: int) -> list: ...  # Same, for guild members ranked after (net_worth, user_id)
+    def buffed_users(self) -> list: ...  # [(user_id, buffs JSON)] for everyone holding a buff
+    def remove_buffs(self, expired: list): ...  # [(user_id, item, end)], each only if the buff still ends at `end`
+    def unsettled_enterprises(self, before: int, user_ids: list = None) -> list: ...  # [(user_id, buffs JSON, enterprise row)] settled at or before `before`, owners with a users row only
+    def pay_profits(self, payouts: list): ...  # [(user_id, net, settled_at)]
+    def shift_profits(self, step: int, dip: bool) -> int: ...  # Every enterprise's profit +step, or -step floored at 5; returns how many
+
+    # Guilds
+    def guild_configs(self) -> list: ...  # [(guild_id, updates_channel_id, surge_active, surge_end, surge_multiplier)]
+    def set_updates_channel(self, guild_id: str, channel_id: str): ...
+    def start_surges(self, surges: list): ...  # [(guild_id, surge_end, multiplier)], for guilds that have a config
+    def add_members(self, rows: list): ...  # [(guild_id, user_id)]
+    def set_members(self, guild_id: str, user_ids: list): ...
+    def remove_members(self, guild_id: str, user_id: str = None): ...  # Everyone in the guild when user_id is None
+
+    # Tax pool, ledger and scheduled jobs
+    def tax_pool(self) -> int: ...
+    def set_tax_pool(self, amount: int): ...
+    def add_tax(self, amount: int): ...
+    def append_ledger(self, entries: list): ...  # [(ts, user_id, delta, reason, ref)]
+    def audit_ledger(self) -> dict: ...  # One incremental pass, see ledger.audit_ledger(); commits
+    def job_times(self) -> dict: ...
+    def save_job_time(self, name: str, next_run: float): ...
+    def delete_job_time(self, name: str): ...
+
+
+ENTERPRISES_SCHEMA = '''CREATE TABLE IF NOT EXISTS enterprises (
+    user_id TEXT PRIMARY KEY,
+    name TEXT,
+    industry TEXT,
+    tier INTEGER,
+    profit INTEGER,
+    work_bonus INTEGER,
+    crime_bonus INTEGER,
+    profit_earned INTEGER,
+    overclock_active INTEGER,
+    overclock_end INTEGER,
+    crash_end INTEGER,
+    created TEXT,
+    settled_at INTEGER
+)'''
+
+UPSERT_ENTERPRISE = (f'INSERT INTO enterprises (user_id, {", ".join(ENTERPRISE_COLUMNS)}) VALUES (?, {", ".join("?" for _ in ENTERPRISE_COLUMNS)}) '
+                     f'ON CONFLICT(user_id) DO UPDATE SET {", ".join(f"{name} = excluded.{name}" for name in ENTERPRISE_COLUMNS)}')
+
+
+class SqliteStorage:
+    # zentrix.db. The writer's connection belongs to the database thread; reader() wraps the current reader thread's
+    # connection (DatabaseExecutor.reader), so read-only handlers see committed data without waiting on the writer
+    def __init__(self, conn, readers=None):
+        self.conn = conn
+        self.readers = readers  # () -> this reader thread's connection
+
+    def reader(self) -> "SqliteStorage":
+        return SqliteStorage(self.readers())
+
+    @property
+    def in_transaction(self) -> bool:
+        return self.conn.in_transaction
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def setup(self, challenge_ids: dict, contract_ids: dict):
+        cursor = self.conn.cursor()
+        cursor.execute('''CREATE TABLE IF NOT EXISTS users (
+            user_id TEXT PRIMARY KEY, 
+            balance INTEGER, 
+            bank INTEGER,
+            last_work INTEGER, 
+            last_crime INTEGER, 
+            last_daily TEXT, 
+            daily_streak INTEGER,
+            inventory TEXT,
+            buffs TEXT,
+            last_buff INTEGER,
+            challenges TEXT,
+            nanopulse_count INTEGER,
+            last_nanopulse_reset TEXT,
+            contracts TEXT,
+            last_rob INTEGER,
+            net_worth INTEGER GENERATED ALWAYS AS (COALESCE(balance, 0) + COALESCE(bank, 0)) VIRTUAL
+        )''')
+        cursor.execute('PRAGMA table_xinfo(users)')
+        if "net_worth" not in [column[1] for column in cursor.fetchall()]:
+            cursor.execute('ALTER TABLE users ADD COLUMN net_worth INTEGER GENERATED ALWAYS AS (COALESCE(balance, 0) + COALESCE(bank, 0)) VIRTUAL')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_net_worth ON users (net_worth DESC)')
+        cursor.execute(ENTERPRISES_SCHEMA)
+        self.migrate_enterprise_blobs()
+        # Profit accrues lazily from settled_at (see settle_profit); existing enterprises start counting from now
+        cursor.execute('PRAGMA table_info(enterprises)')
+        if "settled_at" not in [column[1] for column in cursor.fetchall()]:
+            cursor.execute('ALTER TABLE enterprises ADD COLUMN settled_at INTEGER')
+        cursor.execute('UPDATE enterprises SET settled_at = ? WHERE settled_at IS NULL', (int(datetime.utcnow().timestamp()),))
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_enterprises_settled_at ON enterprises (settled_at)')
+        # Nothing queries by these, and every enterprise write paid for them
+        for index in ('idx_enterprises_overclock_end', 'idx_enterprises_crash_end', 'idx_enterprises_industry_tier'):
+            cursor.execute(f'DROP INDEX IF EXISTS {index}')
+        # Which users belong to which guild, so /top can rank one server's members; filled from interactions and member events
+        cursor.execute('''CREATE TABLE IF NOT EXISTS guild_members (guild_id TEXT, user_id TEXT, PRIMARY KEY (guild_id, user_id)) WITHOUT ROWID''')
+        cursor.execute('''CREATE TABLE IF NOT EXISTS tax_pool (id INTEGER PRIMARY KEY, amount INTEGER)''')
+        cursor.execute('''CREATE TABLE IF NOT EXISTS server_config (guild_id TEXT PRIMARY KEY, updates_channel_id TEXT, surge_active INTEGER, surge_end INTEGER, surge_multiplier REAL)''')
+        # Next run of each scheduled job, so a restart doesn't reset the hourly/daily timers
+        cursor.execute('''CREATE TABLE IF NOT EXISTS scheduled_jobs (name TEXT PRIMARY KEY, next_run REAL)''')
+        cursor.execute('INSERT OR IGNORE INTO tax_pool (id, amount) VALUES (1, 0)')
+        for statement in LEDGER_SCHEMA:
+            cursor.execute(statement)
+        cursor.execute('UPDATE users SET inventory = ? WHERE inventory IS NULL', (json.dumps({}),))
+        cursor.execute('UPDATE users SET buffs = ? WHERE buffs IS NULL', (json.dumps({}),))
+        cursor.execute('UPDATE users SET last_buff = ? WHERE last_buff IS NULL', (0,))
+        cursor.execute('UPDATE users SET challenges = ? WHERE challenges IS NULL', (json.dumps([]),))
+        cursor.execute('UPDATE users SET nanopulse_count = ? WHERE nanopulse_count IS NULL', (0,))
+        cursor.execute('UPDATE users SET last_nanopulse_reset = ? WHERE last_nanopulse_reset IS NULL', ('1970-01-01',))
+        cursor.execute('UPDATE users SET bank = ? WHERE bank IS NULL', (0,))
+        cursor.execute('UPDATE users SET contracts = ? WHERE contracts IS NULL', (json.dumps([]),))
+        cursor.execute('UPDATE users SET last_rob = ? WHERE last_rob IS NULL', (0,))
+        cursor.execute('UPDATE enterprises SET profit_earned = 0 WHERE profit_earned IS NULL')
+        self.migrate_quest_rows(challenge_ids, contract_ids)
+        self.conn.commit()
+
+    def migrate_enterprise_blobs(self):
+        # One-time move from the old (user_id, data JSON) layout to typed columns. One explicit transaction: sqlite3 would
+        # commit the RENAME and CREATE on their own, and a crash before the copy would leave an empty table that passes the check
+        cursor = self.conn.cursor()
+        cursor.execute('PRAGMA table_info(enterprises)')
+        if "data" not in [column[1] for column in cursor.fetchall()]:
+            return
+        self.conn.commit()
+        cursor.execute('BEGIN')
+        cursor.execute('ALTER TABLE enterprises RENAME TO enterprises_blob')
+        cursor.execute(ENTERPRISES_SCHEMA)
+        cursor.execute('''INSERT INTO enterprises (user_id, name, industry, tier, profit, work_bonus, crime_bonus, profit_earned, overclock_active, overclock_end, crash_end, created)
+            SELECT user_id, json_extract(data, '$.name'), json_extract(data, '$.industry'), json_extract(data, '$.tier'), json_extract(data, '$.profit'),
+                   json_extract(data, '$.work_bonus'), json_extract(data, '$.crime_bonus'), COALESCE(json_extract(data, '$.profit_earned'), 0),
+                   COALESCE(json_extract(data, '$.overclock_active'), 0), COALESCE(json_extract(data, '$.overclock_end'), 0),
+                   COALESCE(json_extract(data, '$.crash_end'), 0), json_extract(data, '$.created')
+            FROM enterprises_blob WHERE data IS NOT NULL''')
+        cursor.execute('DROP TABLE enterprises_blob')
+        self.conn.commit()
+        logger.info(f"Migrated {cursor.execute('SELECT COUNT(*) FROM enterprises').fetchone()[0]} enterprises to typed columns")
+
+    def migrate_quest_rows(self, challenge_ids: dict, contract_ids: dict):
+        # Rows from before template ids hold whole task dicts; map them back by task text (tasks that no longer exist are dropped)
+        def compact(entries: str, ids: dict, fields: tuple) -> str:
+            entries = json.loads(entries or '[]')
+            return json.dumps([entry if isinstance(entry, list) else [ids[entry["task"]], *(entry.get(field, 0) for field in fields)]
+                               for entry in entries if isinstance(entry, list) or entry.get("task") in ids])
+
+        rows = [(compact(challenges, challenge_ids, ("progress",)), compact(contracts, contract_ids, ("progress", "start_time")), user_id)
+                for user_id, challenges, contracts in self.conn.execute('''SELECT user_id, challenges, contracts FROM users WHERE challenges LIKE '%"task"%' OR contracts LIKE '%"task"%' ''')]
+        if rows:
+            self.conn.executemany('UPDATE users SET challenges = ?, contracts = ? WHERE user_id = ?', rows)
+            logger.info(f"Moved {len(rows)} users' challenges/contracts to template ids")
+
+    def load_user(self, user_id: str) -> tuple:
+        # users row and enterprise in one round trip
+        row = self.conn.execute(f'SELECT u.user_id, {", ".join("u." + column for column in USER_COLUMNS)}, e.user_id, {", ".join("e." + column for column in ENTERPRISE_COLUMNS)} '
+                                'FROM (SELECT ? AS user_id) AS k LEFT JOIN users AS u ON u.user_id = k.user_id LEFT JOIN enterprises AS e ON e.user_id = k.user_id',
+                                (user_id,)).fetchone()
+        user_row, enterprise_row = row[1:len(USER_COLUMNS) + 1], row[len(USER_COLUMNS) + 2:]
+        return (user_row if row[0] is not None else None), (enterprise_row if row[len(USER_COLUMNS) + 1] is not None else None)
+
+    def save_users(self, columns: tuple, rows: list):
+        names = ", ".join(USER_COLUMNS)
+        placeholders = ", ".join("?" for _ in USER_COLUMNS)
+        updates = ", ".join(f"{name} = excluded.{name}" for name in columns)
+        self.conn.executemany(f'INSERT INTO users (user_id, {names}) VALUES (?, {placeholders}) ON CONFLICT(user_id) DO UPDATE SET {updates}', rows)
+
+    def save_enterprises(self, rows: list):
+        self.conn.executemany(UPSERT_ENTERPRISE, rows)
+
+    def top_net_worth(self, limit: int) -> list:
+        return self.conn.execute('SELECT user_id, net_worth FROM users ORDER BY net_worth DESC LIMIT ?', (limit,)).fetchall()
+
+    def guild_page(self, guild_id: str, after: tuple, limit: int) -> list:
+        # Keyset pagination: everything ranked strictly after the (net_worth, user_id) of the previous page's last row
+        net_worth, user_id = after or (2 ** 63 - 1, '')
+        return self.conn.execute('''SELECT u.user_id, u.net_worth FROM guild_members AS g JOIN users AS u ON u.user_id = g.user_id
+            WHERE g.guild_id = ? AND (u.net_worth < ? OR (u.net_worth = ? AND u.user_id > ?))
+            ORDER BY u.net_worth DESC, u.user_id LIMIT ?''', (guild_id, net_worth, net_worth, user_id, limit)).fetchall()
+
+    def buffed_users(self) -> list:
+        return self.conn.execute("SELECT user_id, buffs FROM users WHERE buffs IS NOT NULL AND buffs NOT IN ('', '{}')").fetchall()
+
+    def remove_buffs(self, expired: list):
+        self.conn.executemany('UPDATE users SET buffs = json_remove(buffs, ?) WHERE user_id = ? AND json_extract(buffs, ?) = ?',
+                              [(f'$."{item}"', user_id, f'$."{item}"', end) for user_id, item, end in expired])
+
+    def unsettled_enterprises(self, before: int, user_ids: list = None) -> list:
+        query = f'SELECT e.user_id, u.buffs, {", ".join("e." + column for column in ENTERPRISE_COLUMNS)} FROM enterprises AS e JOIN users AS u ON u.user_id = e.user_id WHERE e.settled_at <= ?'
+        params = [before]
+        if user_ids is not None:
+            query += ' AND e.user_id IN (SELECT value FROM json_each(?))'
+            params.append(json.dumps(list(user_ids)))
+        return [(row[0], row[1], row[2:]) for row in self.conn.execute(query, params).fetchall()]
+
+    def pay_profits(self, payouts: list):
+        self.conn.executemany('UPDATE users SET balance = balance + ? WHERE user_id = ?', [(net, user_id) for user_id, net, _ in payouts])
+        self.conn.executemany('UPDATE enterprises SET profit_earned = COALESCE(profit_earned, 0) + ?, settled_at = ? WHERE user_id = ?',
+                              [(net, settled_at, user_id) for user_id, net, settled_at in payouts])
+
+    def shift_profits(self, step: int, dip: bool) -> int:
+        if dip:
+            return self.conn.execute('UPDATE enterprises SET profit = MAX(5, profit - ?)', (step,)).rowcount
+        return self.conn.execute('UPDATE enterprises SET profit = profit + ?', (step,)).rowcount
+
+    def guild_configs(self) -> list:
+        return self.conn.execute('SELECT guild_id, updates_channel_id, surge_active, surge_end, surge_multiplier FROM server_config').fetchall()
+
+    def set_updates_channel(self, guild_id: str, channel_id: str):
+        self.conn.execute('INSERT OR REPLACE INTO server_config (guild_id, updates_channel_id, surge_active, surge_end, surge_multiplier) VALUES (?, ?, COALESCE((SELECT surge_active FROM server_config WHERE guild_id = ?), 0), COALESCE((SELECT surge_end FROM server_config WHERE guild_id = ?), 0), COALESCE((SELECT surge_multiplier FROM server_config WHERE guild_id = ?), 1.0))',
+                          (guild_id, channel_id, guild_id, guild_id, guild_id))
+
+    def start_surges(self, surges: list):
+        self.conn.executemany('UPDATE server_config SET surge_active = 1, surge_end = ?, surge_multiplier = ? WHERE guild_id = ?',
+                              [(surge_end, multiplier, guild_id) for guild_id, surge_end, multiplier in surges])
+
+    def add_members(self, rows: list):
+        self.conn.executemany('INSERT OR IGNORE INTO guild_members (guild_id, user_id) VALUES (?, ?)', rows)
+
+    def set_members(self, guild_id: str, user_ids: list):
+        self.conn.execute('DELETE FROM guild_members WHERE guild_id = ?', (guild_id,))
+        self.add_members([(guild_id, user_id) for user_id in user_ids])
+
+    def remove_members(self, guild_id: str, user_id: str = None):
+        if user_id is None:
+            self.conn.execute('DELETE FROM guild_members WHERE guild_id = ?', (guild_id,))
+        else:
+            self.conn.execute('DELETE FROM guild_members WHERE guild_id = ? AND user_id = ?', (guild_id, user_id))
+
+    def tax_pool(self) -> int:
+        result = self.conn.execute('SELECT amount FROM tax_pool WHERE id = 1').fetchone()
+        return result[0] if result and result[0] is not None else 0
+
+    def set_tax_pool(self, amount: int):
+        self.conn.execute('UPDATE tax_pool SET amount = ? WHERE id = 1', (amount,))
+
+    def add_tax(self, amount: int):
+        self.conn.execute('UPDATE tax_pool SET amount = amount + ? WHERE id = 1', (amount,))
+
+    def append_ledger(self, entries: list):
+        self.conn.executemany('INSERT INTO ledger (ts, user_id, delta, reason, ref) VALUES (?, ?, ?, ?, ?)', entries)
+
+    def audit_ledger(self) -> dict:
+        return audit_ledger(self.conn)
+
+    def job_times(self) -> dict:
+        return dict(self.conn.execute('SELECT name, next_run FROM scheduled_jobs').fetchall())
+
+    def save_job_time(self, name: str, next_run: float):
+        self.conn.execute('INSERT INTO scheduled_jobs (name, next_run) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET next_run = excluded.next_run',
+                          (name, next_run))
+
+    def delete_job_time(self, name: str):
+        self.conn.execute('DELETE FROM scheduled_jobs WHERE name = ?', (name,))
+
+
+MISSING = object()
+BALANCE, BANK, BUFFS = (USER_COLUMNS.index(column) for column in ("balance", "bank", "buffs"))
+PROFIT, PROFIT_EARNED, SETTLED_AT = (ENTERPRISE_COLUMNS.index(column) for column in ("profit", "profit_earned", "settled_at"))
+
+
+class MemoryStorage:
+    # Everything in dicts, nothing on disk: for benchmarks, simulations and tests that want the game logic without
+    # SQLite. Writes apply straight away and leave an undo step, so rollback() works like SQLite's. Use it with a
+    # DatabaseExecutor(None), which runs reads on the writer thread too, so nothing here needs locking.
+    def __init__(self):
+        self.users = {}  # user_id -> row
+        self.enterprises = {}
+        self.guilds = {}  # guild_id -> (updates_channel_id, surge_active, surge_end, surge_multiplier)
+        self.members = {}  # guild_id -> {user_id: True}
+        self.jobs = {}
+        self.totals = {"tax_pool": 0}
+        self.ledger = []
+        self.audited = {}  # account -> net worth at the last audit
+        self.audited_upto = 0  # ledger entries already audited
+        self.undo = []
+
+    def setup(self, challenge_ids: dict, contract_ids: dict):
+        pass
+
+    def reader(self) -> "MemoryStorage":
+        return self
+
+    @property
+    def in_transaction(self) -> bool:
+        return bool(self.undo)
+
+    def commit(self):
+        self.undo.clear()
+
+    def rollback(self):
+        while self.undo:
+            self.undo.pop()()
+
+    def put(self, table: dict, key, value):
+        old = table.get(key, MISSING)
+        self.undo.append(functools.partial(self.restore, table, key, old))
+        if value is MISSING:
+            table.pop(key, None)
+        else:
+            table[key] = value
+
+    @staticmethod
+    def restore(table: dict, key, old):
+        if old is MISSING:
+            table.pop(key, None)
+        else:
+            table[key] = old
+
+    def net_worth(self, user_id: str):
+        row = self.users.get(user_id)
+        return None if row is None else (row[BALANCE] or 0) + (row[BANK] or 0)
+
+    def load_user(self, user_id: str) -> tuple:
+        return self.users.get(user_id), self.enterprises.get(user_id)
+
+    def save_users(self, columns: tuple, rows: list):
+        indexes = [USER_COLUMNS.index(column) for column in columns]
+        for user_id, *row in rows:
+            current = self.users.get(user_id)
+            if current is not None:
+                updated = list(current)
+                for index in indexes:
+                    updated[index] = row[index]
+                row = updated
+            self.put(self.users, user_id, tuple(row))
+
+    def save_enterprises(self, rows: list):
+        for user_id, *row in rows:
+            self.put(self.enterprises, user_id, tuple(row))
+
+    def top_net_worth(self, limit: int) -> list:
+        return heapq.nlargest(limit, ((user_id, self.net_worth(user_id)) for user_id in self.users), key=lambda row: row[1])
+
+    def guild_page(self, guild_id: str, after: tuple, limit: int) -> list:
+        net_worth, user_id = after or (2 ** 63 - 1, '')
+        # Only the page itself gets ordered, not every member ranked after the cursor
+        ranked = heapq.nsmallest(limit, ((-worth, member) for member, worth in ((member, self.net_worth(member)) for member in self.members.get(guild_id, ()))
+                                         if worth is not None and (worth < net_worth or (worth == net_worth and member > user_id))))
+        return [(member, -worth) for worth, member in ranked]
+
+    def buffed_users(self) -> list:
+        return [(user_id, row[BUFFS]) for user_id, row in self.users.items() if row[BUFFS] not in (None, '', '{}')]
+
+    def remove_buffs(self, expired: list):
+        for user_id, item, end in expired:
+            row = self.users.get(user_id)
+            buffs = json.loads(row[BUFFS]) if row is not None and row[BUFFS] else {}
+            if buffs.get(item) == end:
+                del buffs[item]
+                self.put(self.users, user_id, row[:BUFFS] + (json.dumps(buffs),) + row[BUFFS + 1:])
+
+    def unsettled_enterprises(self, before: int, user_ids: list = None) -> list:
+        owners = self.enterprises if user_ids is None else [user_id for user_id in user_ids if user_id in self.enterprises]
+        return [(user_id, self.users[user_id][BUFFS], self.enterprises[user_id]) for user_id in owners
+                if user_id in self.users and self.enterprises[user_id][SETTLED_AT] is not None and self.enterprises[user_id][SETTLED_AT] <= before]
+
+    def pay_profits(self, payouts: list):
+        for user_id, net, settled_at in payouts:
+            row = list(self.users[user_id])
+            row[BALANCE] = (row[BALANCE] or 0) + net
+            self.put(self.users, user_id, tuple(row))
+            enterprise = self.enterprises.get(user_id)
+            if enterprise is not None:
+                enterprise = list(enterprise)
+                enterprise[PROFIT_EARNED] = (enterprise[PROFIT_EARNED] or 0) + net
+                enterprise[SETTLED_AT] = settled_at
+                self.put(self.enterprises, user_id, tuple(enterprise))
+
+    def shift_profits(self, step: int, dip: bool) -> int:
+        for user_id, row in list(self.enterprises.items()):
+            profit = max(5, row[PROFIT] - step) if dip else row[PROFIT] + step
+            self.put(self.enterprises, user_id, row[:PROFIT] + (profit,) + row[PROFIT + 1:])
+        return len(self.enterprises)
+
+    def guild_configs(self) -> list:
+        return [(guild_id, *config) for guild_id, config in self.guilds.items()]
+
+    def set_updates_channel(self, guild_id: str, channel_id: str):
+        _, active, end, multiplier = self.guilds.get(guild_id, (None, 0, 0, 1.0))
+        self.put(self.guilds, guild_id, (channel_id, active, end, multiplier))
+
+    def start_surges(self, surges: list):
+        for guild_id, surge_end, multiplier in surges:
+            if guild_id in self.guilds:
+                self.put(self.guilds, guild_id, (self.guilds[guild_id][0], 1, surge_end, multiplier))
+
+    def add_members(self, rows: list):
+        for guild_id, user_id in rows:
+            if guild_id not in self.members:
+                self.put(self.members, guild_id, {})
+            self.put(self.members[guild_id], user_id, True)
+
+    def set_members(self, guild_id: str, user_ids: list):
+        self.remove_members(guild_id)
+        self.add_members([(guild_id, user_id) for user_id in user_ids])
+
+    def remove_members(self, guild_id: str, user_id: str = None):
+        if user_id is None:
+            self.put(self.members, guild_id, MISSING)
+        elif guild_id in self.members:
+            self.put(self.members[guild_id], user_id, MISSING)
+
+    def tax_pool(self) -> int:
+        return self.totals["tax_pool"]
+
+    def set_tax_pool(self, amount: int):
+        self.put(self.totals, "tax_pool", amount)
+
+    def add_tax(self, amount: int):
+        self.put(self.totals, "tax_pool", self.totals["tax_pool"] + amount)
+
+    def append_ledger(self, entries: list):
+        self.undo.append(functools.partial(self.ledger.__delitem__, slice(len(self.ledger), None)))
+        self.ledger.extend(entries)
+
+    def audit_ledger(self) -> dict:
+        # Same pass as ledger.audit_ledger(), over the list
+        deltas = {}
+        by_reason = {}
+        for _, user_id, delta, reason, _ in self.ledger[self.audited_upto:]:
+            deltas[user_id] = deltas.get(user_id, 0) + delta
+            amount, count = by_reason.get(reason, (0, 0))
+            by_reason[reason] = (amount + delta, count + 1)
+        accounts = [(user_id, delta, self.audited.get(user_id), self.tax_pool() if user_id == TAX_POOL_ACCOUNT else self.net_worth(user_id))
+                    for user_id, delta in deltas.items()]
+        for user_id, _, _, actual in accounts:
+            self.audited[user_id] = actual or 0
+        self.audited_upto = len(self.ledger)
+        self.commit()
+        return report_audit(accounts, by_reason)
+
+    def job_times(self) -> dict:
+        return dict(self.jobs)
+
+    def save_job_time(self, name: str, next_run: float):
+        self.put(self.jobs, name, next_run)
+
+    def delete_job_time(self, name: str):
+        self.put(self.jobs, name, MISSING)
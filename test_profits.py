@@ -0,0 +1,47 @@
+import random
+
+from profits import PROFIT_TICK, accrue, tick_rate
+
+BUFFS = {
+    "Tech Relic": {"multiplier": 1.5, "type": "profit"},
+    "Dark Cache": {"multiplier": 2.0, "type": "all"},
+    "NanoChip": {"multiplier": 1.25, "type": "work"},
+}
+TAX_RATE = 0.05
+
+
+def pay_hourly(enterprise: dict, buffs: dict, now: float) -> tuple:
+    # The old payout: one tick an hour, each taxed on its own
+    since = enterprise["settled_at"]
+    ticks = int((now - since) // PROFIT_TICK)
+    net = tax = 0
+    for k in range(1, ticks + 1):
+        gross = tick_rate(enterprise, buffs, BUFFS, since + k * PROFIT_TICK)
+        tick_tax = int(gross * TAX_RATE)
+        net += gross - tick_tax
+        tax += tick_tax
+    return max(ticks, 0), net, tax
+
+
+def random_case(rng: random.Random) -> tuple:
+    since = rng.randint(0, 10 ** 6)
+    enterprise = {"profit": rng.randint(0, 900), "settled_at": since, "overclock_active": rng.random() < 0.5,
+                  "overclock_end": since + rng.randint(-7200, 10 * 3600), "crash_end": since + rng.choice([-1, rng.randint(-3600, 20 * 3600)])}
+    if rng.random() < 0.3:
+        enterprise["overclock_end"] = since + PROFIT_TICK * rng.randint(0, 5)  # Ends exactly on a tick
+    buffs = {item: since + rng.choice([PROFIT_TICK * rng.randint(0, 30), rng.randint(-3600, 40 * 3600)]) for item in BUFFS if rng.random() < 0.5}
+    now = since + rng.randint(0, 200 * 3600)
+    return enterprise, buffs, now
+
+
+def test_accrue_matches_hourly_payout():
+    rng = random.Random(20)
+    for _ in range(5000):
+        enterprise, buffs, now = random_case(rng)
+        assert accrue(enterprise, buffs, BUFFS, TAX_RATE, now) == pay_hourly(enterprise, buffs, now), (enterprise, buffs, now)
+
+
+def test_accrue_nothing_owed():
+    enterprise = {"profit": 100, "settled_at": 1000, "overclock_active": False, "overclock_end": 0, "crash_end": 0}
+    assert accrue(enterprise, {}, BUFFS, TAX_RATE, 1000 + PROFIT_TICK - 1) == (0, 0, 0)
+    assert accrue({**enterprise, "settled_at": None}, {}, BUFFS, TAX_RATE, 10 ** 9) == (0, 0, 0)
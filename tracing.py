@@ -0,0 +1,124 @@
+import contextvars
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger('Zentrix')
+
+# What the current code is running for: "/work", "cache_flush", a scheduled job... Set at the top of each interaction
+# or background task; DatabaseExecutor copies it onto the database threads along with the work
+task_label = contextvars.ContextVar('task_label', default='other')
+
+
+class LabelStats:
+    __slots__ = ("runs", "statements", "seconds", "commits", "slow", "queries")
+
+    def __init__(self):
+        self.runs = 0
+        self.statements = 0
+        self.seconds = 0.0
+        self.commits = 0
+        self.slow = 0
+        self.queries = {}  # sql -> [count, seconds]
+
+
+class SqlStats:
+    # Every statement and commit on a traced connection, added up per task label. Two sets of books: totals since
+    # startup for /debug-stats, and a window that the periodic log summary reads and clears.
+    # Timing covers execute() (the first step); rows fetched afterwards aren't counted. executemany() counts once.
+    def __init__(self, slow_ms: float = 100):
+        self.slow_ms = slow_ms
+        self.lock = threading.Lock()  # Writer and reader threads both record
+        self.totals = {}
+        self.window = {}
+        self.started = time.time()
+        self.window_started = self.started
+
+    def start(self, label: str):
+        # One interaction or one pass of a background task; later statements in this context count toward it
+        task_label.set(label)
+        with self.lock:
+            for books in (self.totals, self.window):
+                books.setdefault(label, LabelStats()).runs += 1
+
+    def record(self, sql: str, seconds: float):
+        label = task_label.get()
+        with self.lock:
+            for books in (self.totals, self.window):
+                stats = books.setdefault(label, LabelStats())
+                stats.statements += 1
+                stats.seconds += seconds
+                query = stats.queries.setdefault(sql, [0, 0.0])
+                query[0] += 1
+                query[1] += seconds
+                if seconds * 1000 >= self.slow_ms:
+                    stats.slow += 1
+        if seconds * 1000 >= self.slow_ms:
+            logger.warning(f"Slow query ({seconds * 1000:.1f}ms, {label}): {' '.join(sql.split())[:300]}")
+
+    def commit(self, seconds: float):
+        label = task_label.get()
+        with self.lock:
+            for books in (self.totals, self.window):
+                stats = books.setdefault(label, LabelStats())
+                stats.commits += 1
+                stats.seconds += seconds
+
+    def take_window(self) -> tuple:
+        with self.lock:
+            window, started = self.window, self.window_started
+            self.window, self.window_started = {}, time.time()
+        return window, time.time() - started
+
+    def summary(self, books: dict = None, limit: int = 10) -> list:
+        # [(label, runs, statements, commits, ms, slow, busiest sql)], most statements first
+        with self.lock:
+            books = self.totals if books is None else books
+            rows = []
+            for label, stats in books.items():
+                busiest = max(stats.queries.items(), key=lambda query: query[1][0], default=(None, None))[0]
+                rows.append((label, stats.runs, stats.statements, stats.commits, round(stats.seconds * 1000, 1), stats.slow, busiest))
+        rows.sort(key=lambda row: row[2], reverse=True)
+        return rows[:limit]
+
+    def connection_factory(self):
+        # For sqlite3.connect(factory=...): a Connection whose cursors, execute()s and commits report here.
+        # Connection.execute() doesn't go through cursor() at the C level, so it's wrapped separately
+        stats = self
+
+        class TracedCursor(sqlite3.Cursor):
+            def execute(self, sql, parameters=()):
+                start = time.perf_counter()
+                try:
+                    return super().execute(sql, parameters)
+                finally:
+                    stats.record(sql, time.perf_counter() - start)
+
+            def executemany(self, sql, parameters):
+                start = time.perf_counter()
+                try:
+                    return super().executemany(sql, parameters)
+                finally:
+                    stats.record(sql, time.perf_counter() - start)
+
+        class TracedConnection(sqlite3.Connection):
+            def cursor(self, factory=TracedCursor):
+                return super().cursor(factory)
+
+            def execute(self, sql, parameters=()):
+                return self.cursor().execute(sql, parameters)
+
+            def executemany(self, sql, parameters):
+                return self.cursor().executemany(sql, parameters)
+
+            def commit(self):
+                if not self.in_transaction:
+                    return super().commit()  # Nothing to commit; don't count it
+                start = time.perf_counter()
+                try:
+                    return super().commit()
+                finally:
+                    stats.commit(time.perf_counter() - start)
+
+        return TracedConnection